@@ -1,16 +1,166 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Booking, UserProfile
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from . import routers
+from .api_log import latency_report
+from .labels import zip_response
+from .models import ApiCallLog, Booking, LabelPurchaseJob, SavedRecipient, TrackingEvent, UserProfile
+
+
+def estimated_row_count(model):
+    """The database's own estimate of a table's row count, or None if it doesn't keep one"""
+    connection = connections[model.objects.db]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that only counts exactly up to ADMIN_EXACT_COUNT_LIMIT rows.
+
+    Past that, an unfiltered changelist uses the database's table estimate and a
+    filtered one reports the limit, so no page load ever counts millions of rows.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        # COUNT(*) over a LIMITed subquery stops scanning after limit + 1 rows
+        count = self.object_list.order_by()[:limit + 1].count()
+        if count <= limit:
+            return count
+        if not self.object_list.query.where:
+            return max(estimated_row_count(self.object_list.model) or 0, count)
+        return count
+
+
+class CarrierFilter(admin.SimpleListFilter):
+    title = 'carrier'
+    parameter_name = 'carrier'
+
+    def lookups(self, request, model_admin):
+        carriers = cache.get('admin:booking-carriers')
+        if carriers is None:
+            # A DISTINCT over the (shipping_carrier, created_at) index, refreshed hourly
+            carriers = sorted(c for c in Booking.objects.order_by().values_list('shipping_carrier', flat=True).distinct() if c)
+            cache.set('admin:booking-carriers', carriers, 3600)
+        return [(carrier, carrier) for carrier in carriers]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(shipping_carrier=self.value())
+        return queryset
+
+
+class ReplicaChangeListMixin:
+    """Changelists read from the replica; saving or deleting pins the staff user to the primary"""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method not in routers.SAFE_METHODS:
+            routers.pin(request.user)
+            return super().changelist_view(request, extra_context)
+        return routers.read_from_replica(super().changelist_view)(request, extra_context)
+
+    def changeform_view(self, request, *args, **kwargs):
+        if request.method not in routers.SAFE_METHODS:
+            routers.pin(request.user)
+        return super().changeform_view(request, *args, **kwargs)
+
+    def delete_view(self, request, *args, **kwargs):
+        if request.method not in routers.SAFE_METHODS:
+            routers.pin(request.user)
+        return super().delete_view(request, *args, **kwargs)
+
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
-    list_display = ['user', 'sender_name', 'recipient_first_name', 'recipient_last_name', 'box_size', 'service', 'created_at']
-    list_filter = ['box_size', 'service', 'created_at']
-    search_fields = ['sender_name', 'recipient_first_name', 'recipient_last_name', 'order_reference', 'user__email']
-    date_hierarchy = 'created_at'
+class BookingAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ['id', 'user', 'recipient_first_name', 'recipient_last_name', 'box_size', 'status',
+                    'shipping_carrier', 'tracking_code', 'created_at']
+    list_select_related = ['user']
+    list_filter = ['status', CarrierFilter, 'box_size', 'created_at']
+    # Every search mode is an exact or prefix match on an indexed column; see get_search_results
+    search_fields = ['=easypost_shipment_id', '=tracking_code', '^order_reference']
+    search_help_text = 'Shipment id (shp_...), tracking code, customer email or the start of an order reference'
+    raw_id_fields = ['user']
     ordering = ['-created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['download_labels']
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.startswith('shp_'):
+            return queryset.filter(easypost_shipment_id=term), False
+        if '@' in term:
+            return queryset.filter(user__in=User.objects.filter(email__iexact=term)), False
+        return queryset.filter(Q(tracking_code=term) | Q(order_reference__startswith=term)), False
+
+    @admin.action(description='Download labels as ZIP')
+    def download_labels(self, request, queryset):
+        bookings = queryset.exclude(label_url__isnull=True).exclude(label_url='').order_by('pk')
+        return zip_response(bookings)
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['business_name', 'user', 'city', 'state', 'country']
     search_fields = ['business_name', 'user__email', 'city', 'state']
-    list_filter = ['country', 'state']
\ No newline at end of file
+    list_filter = ['country', 'state']
+
+@admin.register(LabelPurchaseJob)
+class LabelPurchaseJobAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ['id', 'booking', 'status', 'attempts', 'run_after', 'locked_by', 'updated_at']
+    list_filter = ['status']
+    raw_id_fields = ['booking']
+    ordering = ['-created_at']
+
+
+
+@admin.register(TrackingEvent)
+class TrackingEventAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ['event_id', 'booking', 'status', 'occurred_at', 'created_at']
+    list_filter = ['status']
+    raw_id_fields = ['booking']
+    ordering = ['-created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+@admin.register(ApiCallLog)
+class ApiCallLogAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ['endpoint', 'status_code', 'duration_ms', 'request_bytes', 'response_bytes', 'booking', 'created_at']
+    list_filter = ['endpoint', 'status_code', 'created_at']
+    raw_id_fields = ['booking']
+    ordering = ['-created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        # Called while the template renders, so it runs against the replica too
+        extra_context['latency_report'] = latency_report
+        return super().changelist_view(request, extra_context=extra_context)
+
+@admin.register(SavedRecipient)
+class SavedRecipientAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ['first_name', 'last_name', 'city', 'state', 'user', 'verification', 'use_count', 'last_used_at']
+    list_filter = ['verification']
+    search_fields = ['search_name', 'user__email']
+    raw_id_fields = ['user']
+    readonly_fields = ['address_hash', 'easypost_address_id', 'verified_at', 'use_count', 'last_used_at']
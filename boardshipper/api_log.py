@@ -0,0 +1,109 @@
+# Buffered ledger of outbound EasyPost calls (ApiCallLog)
+
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import Ceil, RowNumber, TruncDate
+from django.utils import timezone
+
+from .models import ApiCallLog
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+_lock = threading.Lock()
+_buffer = []
+
+
+def record(endpoint, booking=None, response=None, started=None, request_bytes=0):
+    """
+    Queue an ApiCallLog row for a finished call.
+
+    Args:
+        endpoint: name of the call, e.g. create_shipment or buy
+        booking: the Booking the call was made for, if any (unsaved ones are not linked)
+        response: requests.Response, or None if the call got no response
+        started: time.perf_counter() value from just before the call
+    """
+    duration = time.perf_counter() - started if started is not None else 0
+    entry = ApiCallLog(
+        booking_id=booking.pk if booking is not None else None,
+        endpoint=endpoint,
+        status_code=response.status_code if response is not None else None,
+        duration_ms=round(duration * 1000),
+        request_bytes=request_bytes,
+        response_bytes=len(response.content) if response is not None else 0,
+        created_at=timezone.now(),
+    )
+    with _lock:
+        _buffer.append(entry)
+        full = len(_buffer) >= settings.API_LOG_BATCH_SIZE
+    if full:
+        flush()
+
+
+def flush(**kwargs):
+    """Write buffered rows in one bulk insert. Logging failures never break the caller."""
+    global _buffer
+    with _lock:
+        entries, _buffer = _buffer, []
+    if not entries:
+        return 0
+    try:
+        ApiCallLog.objects.bulk_create(entries, batch_size=settings.API_LOG_BATCH_SIZE)
+    except DatabaseError:
+        logger.exception("Could not write %d API call log entries", len(entries))
+        return 0
+    return len(entries)
+
+
+# Web requests flush once the response has been sent; commands flush on exit
+request_finished.connect(flush, dispatch_uid='boardshipper.api_log.flush')
+atexit.register(flush)
+
+
+def latency_report(days=14):
+    """
+    Per-day, per-endpoint call count, error rate and p50/p95/p99 latency in ms.
+
+    Percentiles are nearest-rank, computed in the database: rows are numbered
+    by duration within each (day, endpoint) partition and one query per
+    percentile fetches only the row at that rank.
+    """
+    calls = ApiCallLog.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+    partition = [TruncDate('created_at'), F('endpoint')]
+    ranked = calls.annotate(
+        day=TruncDate('created_at'),
+        calls=Window(Count('id'), partition_by=partition),
+        rank=Window(RowNumber(), partition_by=partition, order_by=F('duration_ms').asc()),
+    )
+    latencies = {}
+    for pct in PERCENTILES:
+        at_rank = ranked.filter(rank=Ceil(F('calls') * (pct / 100))).values_list('day', 'endpoint', 'duration_ms')
+        for day, endpoint, duration in at_rank:
+            latencies[day, endpoint, pct] = duration
+
+    rows = []
+    totals = (
+        calls.annotate(day=TruncDate('created_at'))
+        .values('day', 'endpoint')
+        .annotate(
+            calls=Count('id'),
+            errors=Count('id', filter=Q(status_code__isnull=True) | Q(status_code__gte=400)),
+        )
+        .order_by('-day', 'endpoint')
+    )
+    for row in totals:
+        for pct in PERCENTILES:
+            row[f'p{pct}'] = latencies.get((row['day'], row['endpoint'], pct))
+        row['error_rate'] = row['errors'] / row['calls'] if row['calls'] else 0
+        rows.append(row)
+    return rows
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class BoardshipperConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'boardshipper'
+
+    def ready(self):
+        # Cache invalidation for profiles, users and rendered fragments
+        from . import backends, caching, profiles  # noqa: F401
@@ -0,0 +1,69 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+# Users are kept in a per-process cache so the password hash never leaves the
+# process. Each entry carries a version stamp from the shared default cache; a
+# save or delete in any worker replaces the stamp, so other workers reload.
+MAX_USERS = 1024
+
+_users = OrderedDict()
+_lock = threading.Lock()
+
+
+def _version_key(user_id):
+    return f'auth-user:version:{user_id}'
+
+
+def _version(user_id):
+    key = _version_key(user_id)
+    value = cache.get(key)
+    if value is None:
+        value = time.time_ns()
+        cache.set(key, value, None)
+    return value
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that keeps the session's user in a per-process cache.
+
+    The cached copy is dropped whenever the user is saved or deleted, which
+    includes password changes, so session verification still sees them.
+    """
+
+    def get_user(self, user_id):
+        key = str(user_id)
+        version = _version(key)
+        with _lock:
+            entry = _users.get(key)
+            if entry is not None and entry[0] == version:
+                _users.move_to_end(key)
+                user = copy.copy(entry[1])
+            else:
+                user = None
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                with _lock:
+                    _users[key] = (version, copy.copy(user))
+                    _users.move_to_end(key)
+                    while len(_users) > MAX_USERS:
+                        _users.popitem(last=False)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+
+def invalidate(sender, instance, **kwargs):
+    cache.set(_version_key(instance.pk), time.time_ns(), None)
+    with _lock:
+        _users.pop(str(instance.pk), None)
+
+
+post_save.connect(invalidate, sender=User, dispatch_uid='boardshipper.backends.invalidate_saved')
+post_delete.connect(invalidate, sender=User, dispatch_uid='boardshipper.backends.invalidate_deleted')
@@ -0,0 +1,204 @@
+# Microbenchmarks for BoardShipper's hot paths
+
+import statistics
+import timeit
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import pricing, views
+from .forms import BookingForm
+from .models import Booking, UserProfile
+
+SIZES = (10, 1000, 10000)
+
+# One destination per pricing region
+DESTINATIONS = {
+    pricing.CALIFORNIA: ('CA', '92648', 'Huntington Beach'),
+    pricing.WEST: ('OR', '97401', 'Eugene'),
+    pricing.OTHER: ('NY', '11692', 'Rockaway Beach'),
+}
+
+FORM_PAYLOADS = {
+    'valid': {'recipient_state': 'CA', 'recipient_zip': '92648', 'box_size': 'shortboard'},
+    'state_alias': {'recipient_state': 'Calif.', 'recipient_zip': '92648', 'box_size': 'midlength'},
+    'longboard_east': {'recipient_state': 'NY', 'recipient_zip': '11692', 'box_size': 'longboard'},
+    'international': {'recipient_state': 'NSW', 'recipient_zip': '2026', 'box_size': 'shortboard',
+                      'recipient_country': 'Australia'},
+}
+
+
+def booking_form_data(**overrides):
+    data = {
+        'recipient_first_name': 'Kai',
+        'recipient_last_name': 'Lenny',
+        'recipient_email': 'kai@example.com',
+        'recipient_phone': '(555) 123-4567',
+        'recipient_street': '123 Pacific Coast Hwy',
+        'recipient_city': 'Huntington Beach',
+        'recipient_state': 'CA',
+        'recipient_zip': '92648',
+        'recipient_country': 'United States',
+        'box_size': 'shortboard',
+        'weight': '12',
+        'order_reference': 'ORD-1001',
+    }
+    data.update(overrides)
+    return data
+
+
+def sample_bookings(user, count, start_pk=1):
+    """Unsaved bookings with realistic field values, newest first"""
+    now = timezone.now()
+    bookings = []
+    for i in range(count):
+        state, zip_code, city = list(DESTINATIONS.values())[i % len(DESTINATIONS)]
+        bookings.append(Booking(
+            pk=start_pk + i if start_pk else None,
+            user=user,
+            sender_name='Benchmark Surf Co',
+            recipient_first_name='Kai',
+            recipient_last_name=f'Customer {i}',
+            recipient_email=f'customer{i}@example.com',
+            recipient_phone='(555) 123-4567',
+            recipient_street=f'{i} Ocean Ave',
+            recipient_city=city,
+            recipient_state=state,
+            recipient_zip=zip_code,
+            recipient_country='United States',
+            box_size=Booking.BOX_SIZE_CHOICES[i % len(Booking.BOX_SIZE_CHOICES)][0],
+            weight=Decimal('12.00'),
+            status=Booking.STATUS_PURCHASED,
+            label_url=f'https://easypost-files.example.com/label_{i}.png',
+            tracking_url=f'https://track.example.com/EZ{i:014d}',
+            easypost_shipment_id=f'shp_bench{user.pk}_{i}',
+            shipping_carrier='GSO',
+            shipping_service='Ground',
+            shipping_rate=Decimal('24.90'),
+            shipping_rate_user=Decimal('55.00'),
+            current_status='in_transit',
+            current_status_at=now,
+            created_at=now - timedelta(minutes=i),
+        ))
+    return bookings
+
+
+def _request(user, path='/'):
+    request = RequestFactory().get(path, HTTP_HOST='localhost')
+    request.user = user
+    return request
+
+
+def pricing_benchmarks():
+    bookings = [
+        Booking(box_size=box_size, recipient_state=state, recipient_zip=zip_code)
+        for box_size, _ in Booking.BOX_SIZE_CHOICES
+        for state, zip_code, _ in DESTINATIONS.values()
+    ]
+
+    def price_all():
+        for booking in bookings:
+            booking.get_customer_price()
+    yield 'pricing.get_customer_price[all combinations]', price_all
+
+
+def form_benchmarks():
+    for name, overrides in FORM_PAYLOADS.items():
+        data = booking_form_data(**overrides)
+        yield f'forms.BookingForm.is_valid[{name}]', lambda data=data: BookingForm(data).is_valid()
+
+
+def template_benchmarks(user, sizes):
+    for size in sizes:
+        context = {'bookings': sample_bookings(user, size), 'next_cursor': None, 'is_first_page': True}
+        request = _request(user)
+        # Rows come from the fragment cache after the first render
+        yield (f'render.shipments_list.html[{size}]',
+               lambda context=context, request=request: render_to_string('shipments_list.html', context, request))
+
+    booking = sample_bookings(user, 1)[0]
+    request = _request(user)
+    yield ('render.booking_detail.html',
+           lambda: render_to_string('booking_detail.html', {'booking': booking, 'label_error': ''}, request))
+
+
+def view_benchmarks(sizes):
+    """views.shipments and views.booking_detail against users with N stored bookings"""
+    for size in sizes:
+        email = f'benchmark-{size}@example.com'
+        user = User.objects.create_user(username=email, email=email)
+        UserProfile.objects.create(user=user, business_name='Benchmark Surf Co', street_address='1 Surf Ave',
+                                   city='San Clemente', state='CA', zip_code='92672', country='United States')
+        Booking.objects.bulk_create(sample_bookings(user, size, start_pk=None), batch_size=1000)
+        booking = Booking.objects.filter(user=user).order_by('pk').first()
+        request = _request(user, '/shipments/')
+        yield f'views.shipments[{size}]', lambda request=request: views.shipments(request)
+        yield (f'views.booking_detail[{size}]',
+               lambda request=request, pk=booking.pk: views.booking_detail(request, pk))
+
+
+def measure(func, repeat=5):
+    """Time one call of func the way timeit does, plus its query count and query time."""
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    timings = [total / number for total in timer.repeat(repeat, number)]
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 4),
+        'min_ms': round(min(timings) * 1000, 4),
+        'queries': len(queries),
+        'query_ms': round(sum(float(q['time'] or 0) for q in queries.captured_queries) * 1000, 4),
+    }
+
+
+def run(sizes=SIZES, repeat=5, only=None, report=None):
+    """
+    Run every benchmark and return {name: result}.
+
+    Benchmarks that need data run inside a transaction that is rolled back
+    afterwards, so the database is left untouched.
+    """
+    results = {}
+    with transaction.atomic():
+        user = User(pk=0, username='benchmark', email='benchmark@example.com')
+        groups = (
+            pricing_benchmarks(),
+            form_benchmarks(),
+            template_benchmarks(user, sizes),
+            view_benchmarks(sizes),
+        )
+        for group in groups:
+            for name, func in group:
+                if only and only not in name:
+                    continue
+                results[name] = measure(func, repeat)
+                if report:
+                    report(name, results[name])
+        transaction.set_rollback(True)
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Regressions of results against a stored baseline.
+
+    A benchmark regresses when its median is more than ``tolerance`` slower
+    than the baseline, or when it runs more queries.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['median_ms'] > before['median_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: {before['median_ms']:.3f}ms -> {result['median_ms']:.3f}ms")
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: {before['queries']} -> {result['queries']} queries")
+    return regressions
@@ -0,0 +1,145 @@
+# Page and fragment caching for rendered HTML
+
+import hashlib
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import lru_cache, wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse
+
+from .metrics import registry
+from .models import Booking, UserProfile
+
+# Rendered HTML lives in a per-process cache. That is safe across workers because
+# every key carries a version that is stored in the database (Booking.version) or
+# in the shared default cache (the per-user generation), so a stale entry is
+# simply never looked up again.
+CACHE_ALIAS = 'fragments'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _count(kind, name, hit):
+    registry.inc('boardshipper_cache_requests_total', kind=kind, fragment=name, result='hit' if hit else 'miss')
+
+
+def _generation_key(user_id):
+    return f'fragments:generation:{user_id}'
+
+
+def generation(user_id):
+    """
+    Nanosecond timestamp of the last change to one of the user's bookings or their profile.
+
+    Kept in the shared default cache; if it has been evicted it restarts at the
+    current time, which only costs a re-render.
+    """
+    key = _generation_key(user_id)
+    value = cache.get(key)
+    if value is None:
+        value = time.time_ns()
+        cache.set(key, value, None)
+    return value
+
+
+def changed_at(user_id):
+    """generation() as a datetime, for Last-Modified"""
+    return datetime.fromtimestamp(generation(user_id) // 1_000_000_000, tz=timezone.utc)
+
+
+@lru_cache(maxsize=None)
+def _templates_stamp():
+    """Newest template modification time, read once per process so a deploy changes every ETag"""
+    mtimes = [
+        path.stat().st_mtime
+        for directory in settings.TEMPLATES[0]['DIRS']
+        for path in Path(directory).rglob('*.html')
+    ]
+    return int(max(mtimes, default=0))
+
+
+def user_etag(request, *parts):
+    """ETag for a page built only from the signed-in user's bookings and profile"""
+    user_id = request.user.pk
+    value = ':'.join(str(part) for part in (_templates_stamp(), user_id, generation(user_id), *parts))
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def bookings_changed(user_ids):
+    """Invalidate the per-user fragments of these users (call after bulk updates that skip signals)"""
+    cache.set_many({_generation_key(user_id): time.time_ns() for user_id in set(user_ids)}, None)
+
+
+def fragment_key(name, user_id, *vary_on):
+    return ':'.join(['fragment', name, str(user_id), *(str(value) for value in vary_on)])
+
+
+def get_fragment(name, key):
+    html = _cache().get(key)
+    _count('fragment', name, html is not None)
+    return html
+
+
+def set_fragment(key, html):
+    _cache().set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def anonymous_page_cache(view):
+    """
+    Serve a view's rendered page from the cache to signed-out visitors.
+
+    Only for pages that look the same to every anonymous visitor: the cache
+    key is the path alone, query strings are ignored.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        key = f'page:{request.path}'
+        cached = _cache().get(key)
+        _count('page', view.__name__, cached is not None)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            _cache().set(key, (response.content, response['Content-Type']), settings.PAGE_CACHE_TIMEOUT)
+        return response
+    return wrapper
+
+
+def stats():
+    """
+    Hits, misses and hit ratio per cache kind ('rates', 'page', 'fragment') and name.
+
+    Counted by the metrics registry, so with METRICS_DIR set this covers
+    every web worker; without it, only lookups made by this process.
+    """
+    counters, _ = registry.collect()
+    totals = defaultdict(lambda: {'hits': 0, 'misses': 0})
+    for (metric, labels), value in counters.items():
+        if metric != 'boardshipper_cache_requests_total':
+            continue
+        labels = dict(labels)
+        totals[labels['kind'], labels['fragment']]['hits' if labels['result'] == 'hit' else 'misses'] += int(value)
+    for total in totals.values():
+        requests = total['hits'] + total['misses']
+        total['hit_ratio'] = total['hits'] / requests if requests else 0.0
+    return dict(sorted(totals.items()))
+
+
+def invalidate(sender, instance, **kwargs):
+    bookings_changed([instance.user_id])
+
+
+for model in (Booking, UserProfile):
+    post_save.connect(invalidate, sender=model, dispatch_uid=f'boardshipper.caching.invalidate_saved.{model.__name__}')
+    post_delete.connect(invalidate, sender=model,
+                        dispatch_uid=f'boardshipper.caching.invalidate_deleted.{model.__name__}')
@@ -0,0 +1,190 @@
+# Shared HTTP client for the EasyPost API
+
+import base64
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from . import metrics
+
+# Status codes worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_session = None
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing ``rate`` calls per second with bursts of ``burst``."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _take(self):
+        """Take a token if one is available; otherwise return the seconds until one is."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def try_acquire(self):
+        return self.rate <= 0 or self._take() == 0
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    """Return the process-wide limiter for EasyPost calls (EASYPOST_RATE_LIMIT per second)."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(settings.EASYPOST_RATE_LIMIT)
+    return _rate_limiter
+
+
+def _build_session(api_key):
+    session = requests.Session()
+    # Retries are handled in request() so that non-idempotent calls can opt out
+    adapter = HTTPAdapter(
+        pool_connections=settings.EASYPOST_POOL_SIZE,
+        pool_maxsize=settings.EASYPOST_POOL_SIZE,
+        max_retries=0,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Authorization': 'Basic ' + base64.b64encode(f"{api_key}:".encode()).decode(),
+        'Content-Type': 'application/json',
+    })
+    session.api_key = api_key
+    return session
+
+
+def get_session(api_key):
+    """Return the process-wide keep-alive session for this API key."""
+    global _session
+    session = _session
+    if session is None or session.api_key != api_key:
+        with _lock:
+            if _session is None or _session.api_key != api_key:
+                _session = _build_session(api_key)
+            session = _session
+    return session
+
+
+def set_rate_limit(rate):
+    """Replace the process-wide limiter, e.g. for a batch command with its own budget."""
+    global _rate_limiter
+    with _lock:
+        _rate_limiter = RateLimiter(rate)
+
+
+def _backoff(attempt):
+    delay = settings.EASYPOST_BACKOFF_FACTOR * (2 ** attempt)
+    return min(delay, settings.EASYPOST_BACKOFF_MAX)
+
+
+def _stage(method, path):
+    """Metrics label for the kind of EasyPost call"""
+    if method == 'POST' and path == '/v2/shipments':
+        return 'create_shipment'
+    if method == 'POST' and re.fullmatch(r'/v2/shipments/[^/]+/buy', path):
+        return 'buy'
+    if method == 'POST' and path == '/v2/addresses':
+        return 'verify_address'
+    if method == 'GET' and path.startswith('/v2/shipments/'):
+        return 'retrieve_shipment'
+    return 'other'
+
+
+def request(api_key, method, path, idempotent=False, deadline=None, **kwargs):
+    """
+    Send a request to EasyPost over the shared session.
+
+    Connection failures (the request never reached EasyPost) and 429s are
+    always retried. Read timeouts and 5xx responses are only retried when
+    ``idempotent`` is True, so purchases are never sent twice.
+
+    With ``deadline`` (a time.monotonic() value), each attempt's timeouts are
+    cut to the time left and requests.exceptions.Timeout is raised once it
+    has passed, so retries can't run past it either.
+
+    Returns:
+        requests.Response of the last attempt
+    """
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        resp = _request(api_key, method, path, idempotent, deadline, **kwargs)
+        outcome = str(resp.status_code)
+        return resp
+    finally:
+        metrics.observe_easypost(_stage(method, path), outcome, time.perf_counter() - started)
+
+
+def _request(api_key, method, path, idempotent, deadline, **kwargs):
+    session = get_session(api_key)
+    url = settings.EASYPOST_API_BASE.rstrip('/') + path
+    connect_timeout, read_timeout = kwargs.pop(
+        'timeout', (settings.EASYPOST_CONNECT_TIMEOUT, settings.EASYPOST_READ_TIMEOUT))
+    retries = settings.EASYPOST_MAX_RETRIES
+
+    attempt = 0
+    while True:
+        if deadline is None:
+            kwargs['timeout'] = (connect_timeout, read_timeout)
+        else:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.exceptions.Timeout(f'Deadline passed before {method} {path} completed')
+            kwargs['timeout'] = (min(connect_timeout, remaining), min(read_timeout, remaining))
+        get_rate_limiter().acquire()
+        try:
+            resp = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            # A read timeout or dropped connection means EasyPost may have acted on it
+            sent = isinstance(e, requests.exceptions.ReadTimeout) or 'Connection aborted' in str(e)
+            if attempt >= retries or (sent and not idempotent):
+                raise
+        else:
+            # A 429 is rejected before processing, so it is safe to retry any call
+            retryable = idempotent or resp.status_code == 429
+            if resp.status_code not in RETRY_STATUSES or attempt >= retries or not retryable:
+                return resp
+            resp.close()
+        delay = _backoff(attempt)
+        if deadline is not None:
+            delay = min(delay, max(0, deadline - time.monotonic()))
+        time.sleep(delay)
+        attempt += 1
+
+
+def post(api_key, path, json=None, idempotent=False, deadline=None):
+    return request(api_key, 'POST', path, idempotent=idempotent, deadline=deadline, json=json)
+
+
+def get(api_key, path, params=None):
+    return request(api_key, 'GET', path, idempotent=True, params=params)
@@ -0,0 +1,115 @@
+# Streaming exports of shipment history
+
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Booking
+
+# Columns in export order
+CUSTOMER_EXPORT_FIELDS = [
+    'id',
+    'created_at',
+    'user__email',
+    'sender_name',
+    'recipient_first_name',
+    'recipient_last_name',
+    'recipient_city',
+    'recipient_state',
+    'recipient_zip',
+    'recipient_country',
+    'box_size',
+    'weight',
+    'order_reference',
+    'status',
+    'easypost_shipment_id',
+    'shipping_carrier',
+    'shipping_service',
+    'shipping_rate_user',
+]
+# shipping_rate is what EasyPost charges us, so it is never shown to customers
+EXPORT_FIELDS = CUSTOMER_EXPORT_FIELDS[:-1] + ['shipping_rate', 'shipping_rate_user']
+
+CHUNK_SIZE = 2000
+
+
+def fields_for(user):
+    """Export columns the given requesting user may see"""
+    return EXPORT_FIELDS if user.is_staff else CUSTOMER_EXPORT_FIELDS
+
+
+def export_queryset(start=None, end=None, user=None, fields=EXPORT_FIELDS):
+    """
+    Bookings to export as value tuples, oldest first.
+
+    Args:
+        start, end: optional dates (inclusive) in the site time zone
+        user: optional User to limit the export to
+        fields: columns to export; the first must be 'id'
+    """
+    bookings = Booking.objects.all()
+    if user is not None:
+        bookings = bookings.filter(user=user)
+    if start:
+        bookings = bookings.filter(created_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        bookings = bookings.filter(created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+    return bookings.order_by('pk').values_list(*fields)
+
+
+def iter_rows(rows, chunk_size=CHUNK_SIZE):
+    """
+    Yield rows from export_queryset() in primary-key chunks.
+
+    QuerySet.iterator() alone isn't enough: on MySQL the driver still loads the
+    whole result set into memory, so each chunk is a separate keyset query.
+    """
+    last_pk = 0
+    while True:
+        chunk = list(rows.filter(pk__gt=last_pk)[:chunk_size].iterator(chunk_size=chunk_size))
+        if not chunk:
+            return
+        yield from chunk
+        last_pk = chunk[-1][0]
+
+
+def _format(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    return str(value)
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (int, str)):
+        return value
+    return _format(value)
+
+
+class _Echo:
+    """File-like object whose write() returns the value instead of buffering it"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, fields=EXPORT_FIELDS):
+    """Yield a header line and then one CSV line per row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in iter_rows(rows):
+        yield writer.writerow([_format(value) for value in row])
+
+
+def iter_ndjson(rows, fields=EXPORT_FIELDS):
+    """Yield one JSON object per line."""
+    for row in iter_rows(rows):
+        yield json.dumps(dict(zip(fields, (_json_value(value) for value in row)))) + '\n'
+
+
+FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
@@ -0,0 +1,224 @@
+# Local stand-in for the parts of the EasyPost API that BoardShipper uses
+
+import base64
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .easypost_client import RateLimiter
+
+# A 1x1 PNG served as every label
+LABEL_PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+# Rates offered for every shipment: (carrier, service, base rate, delivery days)
+RATE_TABLE = [
+    ('GSO', 'Ground', 24.50, 2),
+    ('GSO', 'PriorityOvernight', 61.00, 1),
+    ('USPS', 'GroundAdvantage', 31.25, 4),
+    ('UPS', 'Ground', 35.10, 3),
+]
+
+
+class FakeEasyPost:
+    """
+    In-memory EasyPost with configurable latency, error rate and rate limiting.
+
+    Args:
+        latency: mean response delay in seconds
+        jitter: uniform +/- variation of the delay in seconds
+        error_rate: fraction of requests answered with a 500
+        rate_limit: requests per second before answering 429 (0 = unlimited)
+        carrier_accounts: {account id: carrier}; shipments naming carrier_accounts
+            only get those carriers' rates
+        carrier_latency: {carrier: seconds} extra delay for shipments quoting that carrier
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0.0,
+                 carrier_accounts=None, carrier_latency=None):
+        self.latency = latency
+        self.carrier_accounts = carrier_accounts or {}
+        self.carrier_latency = carrier_latency or {}
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.shipments = {}
+        self.addresses = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def _limited(self):
+        return self.limiter is not None and not self.limiter.try_acquire()
+
+    def handle(self, method, path, body):
+        """Return (status, response dict) for a request."""
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self._limited():
+            return 429, {'error': {'code': 'RATE_LIMITED', 'message': 'Too many requests'}}
+        if self.error_rate and random.random() < self.error_rate:
+            return 500, {'error': {'code': 'INTERNAL_SERVER_ERROR', 'message': 'Simulated failure'}}
+
+        if method == 'POST' and path == '/v2/addresses':
+            return 201, self.create_address(body.get('address') or {}, body.get('verify') or [])
+        if method == 'POST' and path == '/v2/shipments':
+            return 201, self.create_shipment(body.get('shipment') or {})
+        match = re.fullmatch(r'/v2/shipments/([^/]+)/buy', path)
+        if method == 'POST' and match:
+            return self.buy(match.group(1), body)
+        match = re.fullmatch(r'/v2/shipments/([^/]+)', path)
+        if method == 'GET' and match:
+            with self.lock:
+                shipment = self.shipments.get(match.group(1))
+            if shipment is None:
+                return 404, {'error': {'code': 'NOT_FOUND', 'message': 'Shipment not found'}}
+            return 200, shipment
+        return 404, {'error': {'code': 'NOT_FOUND', 'message': f'No route for {method} {path}'}}
+
+    def create_address(self, data, verify):
+        # Streets without a house number fail delivery verification
+        address = dict(data, object='Address', id='adr_' + uuid.uuid4().hex)
+        if verify:
+            success = bool(re.search(r'\d', data.get('street1') or ''))
+            errors = [] if success else [{'code': 'E.ADDRESS.NOT_FOUND', 'message': 'Address not found'}]
+            address['verifications'] = {'delivery': {'success': success, 'errors': errors}}
+        with self.lock:
+            self.addresses[address['id']] = address
+        return address
+
+    def _address(self, data):
+        if data and set(data) == {'id'}:
+            with self.lock:
+                return self.addresses.get(data['id'], data)
+        return data
+
+    def create_shipment(self, data):
+        shipment_id = 'shp_' + uuid.uuid4().hex
+        weight = float((data.get('parcel') or {}).get('weight') or 16)
+        accounts = {
+            account_id: self.carrier_accounts.get(account_id)
+            for account_id in data.get('carrier_accounts') or []
+        }
+        carriers = set(accounts.values()) if accounts else {carrier for carrier, *_ in RATE_TABLE}
+        delay = max((self.carrier_latency.get(carrier, 0) for carrier in carriers), default=0)
+        if delay:
+            time.sleep(delay)
+        account_for = {carrier: account_id for account_id, carrier in accounts.items()}
+        rates = [
+            {
+                'object': 'Rate',
+                'id': 'rate_' + uuid.uuid4().hex,
+                'shipment_id': shipment_id,
+                'carrier': carrier,
+                'carrier_account_id': account_for.get(carrier, 'ca_' + carrier.lower()),
+                'service': service,
+                'rate': '%.2f' % (base + weight / 16 * 0.4),
+                'currency': 'USD',
+                'delivery_days': days,
+            }
+            for carrier, service, base, days in RATE_TABLE
+            if carrier in carriers
+        ]
+        shipment = {
+            'object': 'Shipment',
+            'id': shipment_id,
+            'mode': 'test',
+            'to_address': self._address(data.get('to_address')),
+            'from_address': self._address(data.get('from_address')),
+            'parcel': data.get('parcel'),
+            'reference': data.get('reference'),
+            'rates': rates,
+            'selected_rate': None,
+            'postage_label': None,
+            'tracker': None,
+            'tracking_code': None,
+        }
+        with self.lock:
+            self.shipments[shipment_id] = shipment
+        return shipment
+
+    def buy(self, shipment_id, body):
+        rate_id = (body.get('rate') or {}).get('id')
+        with self.lock:
+            shipment = self.shipments.get(shipment_id)
+            if shipment is None:
+                return 404, {'error': {'code': 'NOT_FOUND', 'message': 'Shipment not found'}}
+            if shipment['selected_rate']:
+                return 422, {'error': {'code': 'SHIPMENT.POSTAGE.EXISTS', 'message': 'Postage already exists'}}
+            rate = next((r for r in shipment['rates'] if r['id'] == rate_id), None)
+            if rate is None:
+                return 422, {'error': {'code': 'SHIPMENT.RATE.INVALID', 'message': 'Rate not found'}}
+            tracking_code = 'EZ' + uuid.uuid4().hex[:14].upper()
+            base_url = self.base_url
+            shipment.update({
+                'selected_rate': rate,
+                'tracking_code': tracking_code,
+                'postage_label': {'object': 'PostageLabel', 'label_url': f'{base_url}/labels/{shipment_id}.png'},
+                'tracker': {
+                    'object': 'Tracker',
+                    'id': 'trk_' + uuid.uuid4().hex,
+                    'shipment_id': shipment_id,
+                    'tracking_code': tracking_code,
+                    'status': 'pre_transit',
+                    'public_url': f'{base_url}/track/{tracking_code}',
+                    'tracking_details': [],
+                },
+            })
+            return 200, dict(shipment)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def serve(self, host='127.0.0.1', port=0):
+        """Start serving in a background thread and return the base URL."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self, status, payload, content_type='application/json'):
+                body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _dispatch(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if method == 'GET' and self.path.startswith('/labels/'):
+                    return self._respond(200, LABEL_PNG, 'image/png')
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    return self._respond(400, {'error': {'code': 'BAD_REQUEST', 'message': 'Invalid JSON'}})
+                status, payload = fake.handle(method, self.path.split('?', 1)[0], body)
+                self._respond(status, payload)
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -1,5 +1,9 @@
+import re
+import uuid
+
 from django import forms
 from .models import Booking
+from . import pricing, zones
 
 # Common country choices for surfboard shipping
 COUNTRY_CHOICES = [
@@ -50,9 +54,14 @@ class BookingForm(forms.ModelForm):
         widget=forms.Select(attrs={'class': 'form-control', 'required': True, 'id': 'id_recipient_country'}),
         label='Country *'
     )
+    # Generated when the form is first shown (see new_idempotency_key) so a
+    # double click or a retried POST can be recognised
+    idempotency_key = forms.RegexField(regex=r'^[A-Za-z0-9_-]+$', max_length=64, required=False,
+                                       widget=forms.HiddenInput)
     class Meta:
         model = Booking
-        exclude = ['user', 'sender_name', 'label_url', 'tracking_url', 'easypost_shipment_id', 'service']
+        exclude = ['user', 'sender_name', 'label_url', 'label_file', 'tracking_url', 'easypost_shipment_id', 'service', 'status', 'import_batch',
+                   'tracking_code', 'current_status', 'current_status_at']
         labels = {
             'recipient_first_name': 'First Name *',
             'recipient_last_name': 'Last Name *',
@@ -96,29 +105,52 @@ class BookingForm(forms.ModelForm):
                 'For international shipping, please contact support.'
             )
         
-        # ONLY allow shipping to these specific states
-        allowed_states = [
-            'CA', 'CALIFORNIA', 
-            'OR', 'OREGON', 
-            'WA', 'WASHINGTON',
-            'CO', 'COLORADO', 
-            'ID', 'IDAHO', 
-            'AZ', 'ARIZONA'
-        ]
-        
-        if recipient_state and recipient_state.upper() not in allowed_states:
-            raise forms.ValidationError(
-                'We are unable to ship to this location. Please contact support for assistance.'
-            )
+        # ONLY allow shipping to the priced regions, classified by ZIP prefix
+        recipient_zip = cleaned_data.get('recipient_zip')
+        if recipient_state or recipient_zip:
+            region = pricing.region_for(recipient_zip, recipient_state)
+            if region == pricing.OTHER:
+                raise forms.ValidationError(
+                    'We are unable to ship to this location. Please contact support for assistance.'
+                )
         
         # Check longboard restrictions
-        if box_size == 'longboard' and recipient_state:
-            longboard_states = ['CA', 'CALIFORNIA', 'OR', 'OREGON', 'WA', 'WASHINGTON', 
-                              'CO', 'COLORADO', 'ID', 'IDAHO', 'AZ', 'ARIZONA']
-            if recipient_state.upper() not in longboard_states:
+        if box_size == 'longboard' and (recipient_state or recipient_zip):
+            if pricing.customer_price(box_size, recipient_state, recipient_zip) is None:
                 raise forms.ValidationError(
                     'Longboard shipping is only available to CA, OR, WA, CO, ID, and AZ. '
                     'Please select Shortboard or Midlength for other states.'
                 )
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+    
+    def clean_idempotency_key(self):
+        # Bookings without a key (CSV imports, old forms) are never deduplicated
+        return self.cleaned_data.get('idempotency_key') or None
+    
+    @staticmethod
+    def new_idempotency_key():
+        return uuid.uuid4().hex
+
+class QuoteForm(forms.Form):
+    """Lane and package details needed to quote a price without booking"""
+    recipient_state = forms.CharField(max_length=100)
+    recipient_zip = forms.CharField(max_length=20)
+    box_size = forms.ChoiceField(choices=Booking.BOX_SIZE_CHOICES)
+    weight = forms.DecimalField(max_digits=10, decimal_places=2, min_value=1)
+
+    def clean_recipient_zip(self):
+        # Every quote that misses the rate cache creates an EasyPost shipment, so
+        # half-typed ZIPs are turned away before they reach it
+        value = self.cleaned_data['recipient_zip'].strip()
+        if not re.fullmatch(r'\d{5}(-?\d{4})?', value) or not zones.state_for_zip(value):
+            raise forms.ValidationError('Enter a complete US ZIP code.')
+        return value
+
+
+class ExportForm(forms.Form):
+    """Filters for shipment history exports"""
+    format = forms.ChoiceField(choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')], required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    user = forms.EmailField(required=False)
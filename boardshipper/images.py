@@ -0,0 +1,133 @@
+# Resized WebP/JPEG/PNG variants of the static images for srcset
+
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is only needed to build variants, not to serve them
+    Image = None
+
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+INDEX_NAME = 'variants.json'
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+_index = None
+_index_mtime = None
+
+
+def source_dir():
+    return Path(settings.IMAGE_VARIANT_SOURCE_DIR)
+
+
+def variants_dir():
+    return source_dir() / 'variants'
+
+
+def static_name(path):
+    """Name of a file under STATICFILES_DIRS[0] as passed to {% static %}"""
+    return Path(path).relative_to(settings.STATICFILES_DIRS[0]).as_posix()
+
+
+def _widths(original_width):
+    """Configured widths narrower than the image, plus the image itself capped at the widest one"""
+    widths = sorted(w for w in settings.IMAGE_VARIANT_WIDTHS if w < original_width)
+    top = min(original_width, max(settings.IMAGE_VARIANT_WIDTHS))
+    if top not in widths:
+        widths.append(top)
+    return widths
+
+
+def _is_opaque(image):
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        return image.convert('RGBA').getchannel('A').getextrema() == (255, 255)
+    return True
+
+
+def _save(image, path, fmt):
+    if fmt == 'WEBP':
+        image.save(path, 'WEBP', quality=WEBP_QUALITY, method=6)
+    elif fmt == 'JPEG':
+        image.convert('RGB').save(path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(path, 'PNG', optimize=True)
+
+
+def build_variants(source, force=False):
+    """
+    Write the variants of one source image and return its index entry.
+
+    PNGs without real transparency get JPEG fallbacks; transparent ones keep
+    PNG. Variants newer than the source are left alone unless ``force``.
+    """
+    source = Path(source)
+    out_dir = variants_dir()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with Image.open(source) as image:
+        image.load()
+        width, height = image.size
+        fallback = 'JPEG' if source.suffix.lower() != '.png' or _is_opaque(image) else 'PNG'
+        fallback_ext = '.jpg' if fallback == 'JPEG' else '.png'
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if fallback == 'PNG' else 'RGB')
+
+        variants = []
+        for variant_width in _widths(width):
+            variant_height = max(1, round(height * variant_width / width))
+            resized = None
+            entry = {'width': variant_width}
+            for key, fmt, ext in (('webp', 'WEBP', '.webp'), ('fallback', fallback, fallback_ext)):
+                path = out_dir / f'{source.stem}-{variant_width}{ext}'
+                if force or not path.exists() or path.stat().st_mtime < source.stat().st_mtime:
+                    if resized is None:
+                        resized = image.resize((variant_width, variant_height), Image.LANCZOS)
+                    _save(resized, path, fmt)
+                entry[key] = static_name(path)
+            variants.append(entry)
+    return {'width': width, 'height': height, 'variants': variants}
+
+
+def build_all(force=False, report=None):
+    """
+    Build variants for every image directly in IMAGE_VARIANT_SOURCE_DIR and
+    write the index the {% responsive_image %} tag reads.
+    """
+    if Image is None:
+        raise RuntimeError('Pillow is required to build image variants (pip install Pillow)')
+    index = {}
+    for source in sorted(source_dir().iterdir()):
+        if not source.is_file() or source.suffix.lower() not in SOURCE_EXTENSIONS:
+            continue
+        index[static_name(source)] = entry = build_variants(source, force=force)
+        if report:
+            report(source, entry)
+    index_path = variants_dir() / INDEX_NAME
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    index_path.write_text(json.dumps(index, indent=2, sort_keys=True))
+    global _index
+    _index = None
+    return index
+
+
+def load_index():
+    """The variants index, re-read whenever the file changes"""
+    global _index, _index_mtime
+    path = variants_dir() / INDEX_NAME
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    if _index is None or mtime != _index_mtime:
+        _index = json.loads(path.read_text())
+        _index_mtime = mtime
+    return _index
+
+
+def variants(name):
+    """Index entry for a static image name such as 'images/Frye.jpg', or None"""
+    return load_index().get(name)
@@ -0,0 +1,213 @@
+# Bulk booking import from CSV files
+
+import csv
+import io
+import itertools
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.db import connection, transaction
+
+from . import caching, labels, zones
+from .forms import BookingForm
+from .jobs import enqueue_label_purchases
+from .models import Booking
+from .utils import create_easypost_shipment
+
+# Columns read from each CSV row; anything else in the file is ignored
+CSV_FIELDS = [
+    'recipient_first_name',
+    'recipient_last_name',
+    'recipient_email',
+    'recipient_phone',
+    'recipient_street',
+    'recipient_city',
+    'recipient_state',
+    'recipient_zip',
+    'recipient_country',
+    'box_size',
+    'weight',
+    'order_reference',
+    'additional_info',
+]
+
+
+class CSVFileError(ValueError):
+    """
+    The upload can't be read as a UTF-8 CSV file.
+
+    Raised by import_bookings() with ``results`` and ``bookings`` set to what
+    was imported from the rows before the bad one.
+    """
+    results = ()
+    bookings = ()
+
+
+def iter_csv_rows(fileobj):
+    """
+    Yield (line_number, row) pairs from a CSV file without reading it all into memory.
+
+    Header names are matched case-insensitively. Accepts binary or text file
+    objects. Raises CSVFileError for text that isn't UTF-8 or isn't valid CSV.
+    """
+    if isinstance(fileobj, io.TextIOBase):
+        text = fileobj
+    else:
+        text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [name.strip().lower() for name in header]
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            values = dict(zip(columns, (cell.strip() for cell in row)))
+            yield reader.line_num, {field: values.get(field, '') for field in CSV_FIELDS}
+    except UnicodeDecodeError:
+        raise CSVFileError(f"Around line {reader.line_num + 1}: the file isn't UTF-8 text. "
+                           "Save it as \"CSV UTF-8\" and upload it again.") from None
+    except csv.Error as e:
+        raise CSVFileError(f'Line {reader.line_num}: not a valid CSV file ({e}).') from None
+
+
+def _fill_states(rows):
+    """Fill in a missing recipient_state from the ZIP code, for a batch of rows"""
+    blank = [row for _, row in rows if not row['recipient_state']]
+    for row, state in zip(blank, zones.states_for_zips(row['recipient_zip'] for row in blank)):
+        row['recipient_state'] = state
+
+
+def _error_text(form):
+    errors = []
+    for field, messages in form.errors.items():
+        prefix = '' if field == '__all__' else f'{field}: '
+        errors.extend(prefix + message for message in messages)
+    return '; '.join(errors)
+
+
+def _insert(user, batch_id, bookings):
+    """Bulk insert bookings and make sure each instance has its primary key."""
+    Booking.objects.bulk_create(bookings)
+    caching.bookings_changed([user.pk])
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # MySQL doesn't return ids from bulk inserts; rows from one INSERT get ascending ids
+        missing = [booking for booking in bookings if booking.pk is None]
+        saved = (Booking.objects
+                 .filter(user=user, import_batch=batch_id)
+                 .order_by('-pk')
+                 .values_list('pk', flat=True)[:len(missing)])
+        for booking, pk in zip(missing, reversed(list(saved))):
+            booking.pk = pk
+
+
+def import_bookings(user, fileobj, batch_size=500):
+    """
+    Validate every CSV row with BookingForm and bulk insert the valid ones as pending bookings.
+
+    Returns:
+        (results, bookings): a per-row report of dicts with line, status,
+        booking_id and error, and the list of saved Booking objects
+
+    Raises:
+        CSVFileError if the file stops being readable; rows before that are
+        still imported and attached to the exception
+    """
+    profile = user.profile
+    batch_id = uuid.uuid4().hex
+    results = []
+    saved = []
+    pending = []
+
+    def flush():
+        with transaction.atomic():
+            _insert(user, batch_id, [booking for _, booking in pending])
+        for result, booking in pending:
+            result['booking_id'] = booking.pk
+            saved.append(booking)
+        pending.clear()
+
+    rows = iter_csv_rows(fileobj)
+    file_error = None
+    while file_error is None:
+        chunk = []
+        try:
+            for item in itertools.islice(rows, batch_size):
+                chunk.append(item)
+        except CSVFileError as e:
+            file_error = e
+        if not chunk:
+            break
+        _fill_states(chunk)
+        for line, row in chunk:
+            form = BookingForm(data=row)
+            result = {'line': line, 'status': 'ok', 'booking_id': None, 'error': ''}
+            results.append(result)
+            if not form.is_valid():
+                result['status'] = 'error'
+                result['error'] = _error_text(form)
+                continue
+            booking = form.save(commit=False)
+            booking.user = user
+            booking.sender_name = profile.business_name
+            booking.service = 'door-to-door'
+            booking.status = Booking.STATUS_PENDING
+            booking.import_batch = batch_id
+            pending.append((result, booking))
+        if pending:
+            flush()
+
+    if file_error is not None:
+        file_error.results, file_error.bookings = results, saved
+        raise file_error
+    return results, saved
+
+
+def queue_labels(bookings):
+    """Hand imported bookings to the label worker queue."""
+    with transaction.atomic():
+        enqueue_label_purchases(bookings)
+
+
+def _purchase(sender_profile, booking):
+    result = create_easypost_shipment(sender_profile, booking)
+    try:
+        label = labels.fetch_label(result['label_url']) if result['label_url'] else None
+    except requests.RequestException:
+        label = None  # store_label() will retry the download
+    return result, label
+
+
+def purchase_labels(bookings, sender_profile, workers=4):
+    """
+    Buy labels for saved bookings concurrently.
+
+    Only the EasyPost calls and label downloads run in the thread pool (which shares
+    the client's rate limiter); bookings are saved from the calling thread as each
+    purchase completes.
+
+    Returns:
+        dict mapping booking id to an error message, or '' on success
+    """
+    outcome = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            pool.submit(_purchase, sender_profile, booking): booking
+            for booking in bookings
+        }
+        for future in as_completed(futures):
+            booking = futures[future]
+            try:
+                result, label = future.result()
+            except Exception as e:
+                booking.status = Booking.STATUS_FAILED
+                booking.save(update_fields=['status'])
+                outcome[booking.pk] = str(e) or e.__class__.__name__
+                continue
+            booking.apply_shipment_result(result)
+            booking.save()
+            labels.store_label(booking, label)
+            outcome[booking.pk] = ''
+    return outcome
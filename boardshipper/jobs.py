@@ -0,0 +1,129 @@
+# Database-backed queue for EasyPost label purchases
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import api_log, caching, labels
+from .models import Booking, LabelPurchaseJob
+from .utils import EasyPostError, create_easypost_shipment
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_label_purchase(booking):
+    """Queue a label purchase for a saved, pending booking."""
+    return LabelPurchaseJob.objects.create(booking=booking, run_after=timezone.now())
+
+
+def enqueue_label_purchases(bookings):
+    """Queue label purchases for many saved bookings in one insert."""
+    now = timezone.now()
+    return LabelPurchaseJob.objects.bulk_create(
+        [LabelPurchaseJob(booking=booking, run_after=now) for booking in bookings]
+    )
+
+
+def claim_job(worker_id, jobs=None):
+    """
+    Claim the next runnable job, or return None if the queue is empty.
+
+    ``jobs`` optionally narrows the queue, e.g. to one set of bookings.
+
+    Rows are locked with SKIP LOCKED where the database supports it, and the
+    queued -> running transition is a conditional UPDATE, so two workers can
+    never claim the same job.
+    """
+    now = timezone.now()
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    with transaction.atomic():
+        job = (
+            (jobs if jobs is not None else LabelPurchaseJob.objects.all())
+            .select_for_update(skip_locked=skip_locked)
+            .filter(status=LabelPurchaseJob.STATUS_QUEUED, run_after__lte=now)
+            .order_by('run_after', 'pk')
+            .first()
+        )
+        if job is None:
+            return None
+        claimed = LabelPurchaseJob.objects.filter(
+            pk=job.pk, status=LabelPurchaseJob.STATUS_QUEUED
+        ).update(
+            status=LabelPurchaseJob.STATUS_RUNNING,
+            locked_at=now,
+            locked_by=worker_id,
+            attempts=F('attempts') + 1,
+        )
+        if not claimed:
+            return None
+    job.refresh_from_db()
+    return job
+
+
+def fail_stale_jobs():
+    """
+    Fail jobs whose worker died mid-purchase.
+
+    They are not re-queued: the label may already have been bought, so they
+    are left for an admin to check against the EasyPost dashboard.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.LABEL_JOB_LOCK_TIMEOUT)
+    stale = LabelPurchaseJob.objects.filter(
+        status=LabelPurchaseJob.STATUS_RUNNING, locked_at__lt=cutoff
+    )
+    booking_ids = list(stale.values_list('booking_id', flat=True))
+    if not booking_ids:
+        return 0
+    count = stale.update(status=LabelPurchaseJob.STATUS_FAILED, last_error='Worker stopped while purchasing the label.')
+    Booking.objects.filter(pk__in=booking_ids, status=Booking.STATUS_PENDING).update(
+        status=Booking.STATUS_FAILED, version=F('version') + 1)
+    caching.bookings_changed(Booking.objects.filter(pk__in=booking_ids).values_list('user_id', flat=True))
+    return count
+
+
+def run_job(job):
+    """Create the shipment and buy the label for a claimed job."""
+    booking = Booking.objects.select_related('user__profile').get(pk=job.booking_id)
+    try:
+        result = create_easypost_shipment(booking.user.profile, booking)
+    except Exception as e:
+        retryable = isinstance(e, EasyPostError) and e.retryable
+        job.last_error = str(e)
+        if retryable and job.attempts < settings.LABEL_JOB_MAX_ATTEMPTS:
+            job.status = LabelPurchaseJob.STATUS_QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=settings.LABEL_JOB_RETRY_DELAY * (2 ** (job.attempts - 1)))
+            job.save(update_fields=['status', 'run_after', 'last_error', 'updated_at'])
+            logger.warning("Label job %s failed, retrying: %s", job.pk, e)
+        else:
+            job.status = LabelPurchaseJob.STATUS_FAILED
+            job.save(update_fields=['status', 'last_error', 'updated_at'])
+            booking.status = Booking.STATUS_FAILED
+            booking.save(update_fields=['status'])
+            logger.error("Label job %s failed: %s", job.pk, e)
+        return False
+
+    with transaction.atomic():
+        booking.apply_shipment_result(result)
+        booking.save()
+        job.status = LabelPurchaseJob.STATUS_DONE
+        job.last_error = ''
+        job.save(update_fields=['status', 'last_error', 'updated_at'])
+    # Keep a local copy so reprints don't go back to EasyPost
+    labels.store_label(booking)
+    return True
+
+
+def run_next_job(worker_id, jobs=None):
+    """Claim and run one job. Returns False if there was nothing to do."""
+    job = claim_job(worker_id, jobs)
+    if job is None:
+        return False
+    try:
+        run_job(job)
+    finally:
+        api_log.flush()
+    return True
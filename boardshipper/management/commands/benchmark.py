@@ -0,0 +1,48 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from boardshipper import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Run the hot-path microbenchmarks and compare them against a saved baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks.json'),
+                            help='Baseline JSON file to compare against (default: benchmarks.json)')
+        parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed slowdown before a benchmark counts as a regression (default 0.25 = 25%%)')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--sizes', default=','.join(str(size) for size in benchmarks.SIZES),
+                            help='Comma-separated booking counts for rendering and view benchmarks')
+        parser.add_argument('--only', help='Only run benchmarks whose name contains this text')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        baseline_path = Path(options['baseline'])
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+
+        def report(name, result):
+            line = f"{name:<50} {result['median_ms']:>10.3f}ms  {result['queries']:>3} queries"
+            before = baseline.get(name)
+            if before and before['median_ms']:
+                line += f"  ({(result['median_ms'] / before['median_ms'] - 1) * 100:+.0f}%)"
+            self.stdout.write(line)
+
+        results = benchmarks.run(sizes=sizes, repeat=options['repeat'], only=options['only'], report=report)
+
+        if options['save']:
+            baseline.update(results)
+            baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f'Saved baseline to {baseline_path}')
+            return
+
+        regressions = benchmarks.compare(results, baseline, options['tolerance'])
+        if regressions:
+            raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+        if baseline:
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from boardshipper import images
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP and JPEG/PNG variants of the static images for responsive srcsets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that are already up to date')
+
+    def handle(self, *args, **options):
+        def report(source, entry):
+            widths = ', '.join(str(variant['width']) for variant in entry['variants'])
+            self.stdout.write(f"{source.name:<25} {entry['width']}x{entry['height']} -> {widths}")
+
+        try:
+            index = images.build_all(force=options['force'], report=report)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Built variants for {len(index)} image(s) in {images.variants_dir()}'))
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from boardshipper import caching
+
+
+class Command(BaseCommand):
+    help = ('Show hit ratios of the rate, page and fragment caches. The counts come from '
+            'the web workers\' metrics snapshots, so METRICS_DIR must be set for both.')
+
+    def handle(self, *args, **options):
+        if not settings.METRICS_DIR:
+            raise CommandError('METRICS_DIR is not set, so cache lookups made by the web workers '
+                               'are not visible to this command')
+        totals = caching.stats()
+        if not totals:
+            self.stdout.write('No cache lookups recorded yet')
+        for (kind, name), total in totals.items():
+            self.stdout.write(f"{kind:<10} {name:<20} {total['hits']:>8} hits {total['misses']:>8} misses"
+                              f"  {total['hit_ratio']:.1%}")
@@ -0,0 +1,21 @@
+from django.contrib.staticfiles.management.commands.collectstatic import Command as CollectStaticCommand
+from django.core.management import call_command
+
+from boardshipper import images
+
+
+class Command(CollectStaticCommand):
+    """collectstatic that builds the image variants first so they are collected and hashed too"""
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--skip-image-variants', action='store_true',
+                            help='Collect without (re)building the responsive image variants')
+
+    def handle(self, **options):
+        if not options['skip_image_variants'] and not options['dry_run']:
+            if images.Image is None:
+                self.stderr.write('Pillow is not installed; collecting without rebuilding image variants')
+            else:
+                call_command('build_image_variants', verbosity=options['verbosity'], stdout=self.stdout)
+        return super().handle(**options)
@@ -0,0 +1,35 @@
+import sys
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from boardshipper import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream shipment history as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--user', help='Only export bookings for this email')
+        parser.add_argument('--output', help='File to write to (default: stdout)')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user with email {options['user']}")
+        rows = exports.export_queryset(start=options['start'], end=options['end'], user=user)
+        generate, _ = exports.FORMATS[options['format']]
+
+        out = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for line in generate(rows):
+                out.write(line)
+        finally:
+            if out is not sys.stdout:
+                out.close()
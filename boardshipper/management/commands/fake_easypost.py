@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from boardshipper.fake_easypost import FakeEasyPost
+
+
+class Command(BaseCommand):
+    help = 'Run a local fake EasyPost API (point EASYPOST_API_BASE at it)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.3, help='Mean response delay in seconds')
+        parser.add_argument('--jitter', type=float, default=0.1, help='+/- variation of the delay in seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500')
+        parser.add_argument('--rate-limit', type=float, default=0.0, help='Requests per second before answering 429')
+
+    def handle(self, *args, **options):
+        fake = FakeEasyPost(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            rate_limit=options['rate_limit'],
+        )
+        url = fake.serve(options['host'], options['port'])
+        self.stdout.write(f'Fake EasyPost listening on {url}')
+        self.stdout.write(f'Run the app with EASYPOST_API_BASE={url} and any EZTK... API key')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            fake.shutdown()
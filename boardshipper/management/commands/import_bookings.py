@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from boardshipper.imports import CSVFileError, import_bookings, purchase_labels, queue_labels
+
+
+class Command(BaseCommand):
+    help = 'Import bookings from a CSV file and purchase their labels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with one recipient per row')
+        parser.add_argument('--user', required=True, help='Email of the account that owns the bookings')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent label purchases')
+        parser.add_argument('--queue', action='store_true', help='Queue purchases for label_worker instead of buying now')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.select_related('profile').get(email=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}")
+        if not hasattr(user, 'profile'):
+            raise CommandError(f"{user.email} has no business profile")
+
+        file_error = None
+        with open(options['path'], 'rb') as f:
+            try:
+                results, bookings = import_bookings(user, f)
+            except CSVFileError as e:
+                file_error = e
+                results, bookings = e.results, e.bookings
+
+        if options['queue']:
+            queue_labels(bookings)
+            outcome = {}
+        else:
+            outcome = purchase_labels(bookings, user.profile, workers=options['workers'])
+
+        failures = 0
+        for row in results:
+            if row['status'] == 'error':
+                failures += 1
+                self.stdout.write(f"line {row['line']}: ERROR {row['error']}")
+                continue
+            error = outcome.get(row['booking_id'], '')
+            if error:
+                failures += 1
+                self.stdout.write(f"line {row['line']}: booking #{row['booking_id']} LABEL FAILED {error}")
+            elif options['queue']:
+                self.stdout.write(f"line {row['line']}: booking #{row['booking_id']} queued")
+            else:
+                self.stdout.write(f"line {row['line']}: booking #{row['booking_id']} ok")
+        self.stdout.write(f'{len(results) - failures} of {len(results)} rows succeeded')
+        if file_error is not None:
+            raise CommandError(str(file_error))
@@ -0,0 +1,61 @@
+import os
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from boardshipper.jobs import fail_stale_jobs, run_next_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued EasyPost label purchases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of concurrent worker threads')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.poll_interval = options['poll_interval']
+        self.once = options['once']
+        self.stop = threading.Event()
+
+        failed = fail_stale_jobs()
+        if failed:
+            self.stderr.write(f'Marked {failed} stale job(s) as failed')
+
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [
+            threading.Thread(target=self.work, args=(f'{prefix}:{i}',), daemon=True)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f'Started {workers} label worker(s)')
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after in-flight purchases finish...')
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self, worker_id):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    did_work = run_next_job(worker_id)
+                except Exception as e:
+                    self.stderr.write(f'[{worker_id}] {e}')
+                    did_work = False
+                if not did_work:
+                    if self.once:
+                        return
+                    self.stop.wait(self.poll_interval)
+        finally:
+            connection.close()
@@ -0,0 +1,193 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection
+from django.test import Client
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import reverse
+
+from boardshipper import utils
+from boardshipper.fake_easypost import FakeEasyPost
+from boardshipper.jobs import run_next_job
+from boardshipper.models import LabelPurchaseJob, UserProfile
+from boardshipper.utils import percentile
+
+BOOKING_DATA = {
+    'recipient_first_name': 'Load',
+    'recipient_last_name': 'Test',
+    'recipient_email': 'loadtest@example.com',
+    'recipient_phone': '(555) 123-4567',
+    'recipient_street': '123 Pacific Coast Hwy',
+    'recipient_city': 'Huntington Beach',
+    'recipient_state': 'CA',
+    'recipient_zip': '92648',
+    'recipient_country': 'United States',
+    'box_size': 'shortboard',
+    'weight': '12',
+}
+
+
+# Every cache is private to the run: the shared default cache is keyed by user
+# id, and ids in the throwaway database overlap the real ones
+LOADTEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'loadtest-{alias}'}
+    for alias in settings.CACHES
+}
+
+
+class Command(BaseCommand):
+    help = ('Drive views.book with concurrent simulated users against a fake EasyPost and report throughput. '
+            'Runs against a throwaway test database, so no bookings or label jobs reach the real queue.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Concurrent simulated users')
+        parser.add_argument('--bookings-per-user', type=int, default=5)
+        parser.add_argument('--label-workers', type=int, default=4, help='Concurrent label purchase workers')
+        parser.add_argument('--latency', type=float, default=0.3, help='Fake EasyPost mean latency in seconds')
+        parser.add_argument('--jitter', type=float, default=0.1)
+        parser.add_argument('--error-rate', type=float, default=0.0)
+        parser.add_argument('--rate-limit', type=float, default=0.0, help='Fake EasyPost requests/second before 429s')
+        parser.add_argument('--external', action='store_true',
+                            help='Use the EasyPost at EASYPOST_API_BASE (e.g. a separate fake_easypost) instead of an in-process one')
+
+    def handle(self, *args, **options):
+        fake = None
+        api_base = settings.EASYPOST_API_BASE
+        if options['external']:
+            if 'api.easypost.com' in api_base:
+                raise CommandError('Refusing to load test the real EasyPost API; point EASYPOST_API_BASE at fake_easypost.')
+        else:
+            fake = FakeEasyPost(
+                latency=options['latency'],
+                jitter=options['jitter'],
+                error_rate=options['error_rate'],
+                rate_limit=options['rate_limit'],
+            )
+            api_base = fake.serve()
+
+        # Bookings and label jobs go to a test database (test_<NAME>, or a temporary
+        # SQLite file) that is destroyed afterwards, never the one label_worker polls.
+        # Label files and metrics snapshots go to the same temporary directory.
+        test_settings = connection.settings_dict['TEST']
+        tmpdir = tempfile.mkdtemp(prefix='loadtest-')
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # In-memory SQLite locks whole tables between threads, which isn't what we want to measure
+            test_settings['NAME'] = os.path.join(tmpdir, 'loadtest.sqlite3')
+        storages = {
+            **settings.STORAGES,
+            'labels': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': os.path.join(tmpdir, 'labels')},
+            },
+        }
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS})
+        api_key = utils.EASYPOST_API_KEY
+        utils.EASYPOST_API_KEY = 'EZTK-loadtest'
+        try:
+            with override_settings(EASYPOST_API_BASE=api_base, DATABASE_REPLICA_ALIAS=None, CACHES=LOADTEST_CACHES,
+                                   STORAGES=storages, METRICS_DIR=os.path.join(tmpdir, 'metrics')):
+                users = self.create_users(uuid.uuid4().hex[:8], options['users'])
+                self.book_phase(users, options['bookings_per_user'])
+                self.label_phase(users, options['label_workers'])
+        finally:
+            utils.EASYPOST_API_KEY = api_key
+            teardown_databases(old_config, verbosity=0)
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            if fake is not None:
+                fake.shutdown()
+
+    def create_users(self, run_id, count):
+        users = []
+        for i in range(count):
+            email = f'loadtest-{run_id}-{i}@example.com'
+            user = User.objects.create_user(username=email, email=email, first_name='Load Test Shop')
+            UserProfile.objects.create(
+                user=user,
+                business_name='Load Test Shop',
+                street_address='1 Surf Ave',
+                city='San Clemente',
+                state='CA',
+                zip_code='92672',
+                country='United States',
+            )
+            users.append(user)
+        return users
+
+    def book_phase(self, users, per_user):
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        url = reverse('book')
+
+        def simulate(user):
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+            try:
+                for _ in range(per_user):
+                    started = time.perf_counter()
+                    response = client.post(url, BOOKING_DATA)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        if response.status_code != 302:
+                            errors.append(response.status_code)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(users)) as pool:
+            list(pool.map(simulate, users))
+        self.report('POST /book/', latencies, len(errors), time.perf_counter() - started)
+
+    def label_phase(self, users, workers):
+        jobs = LabelPurchaseJob.objects.filter(booking__user__in=users)
+        latencies = []
+        db_errors = []
+        lock = threading.Lock()
+
+        def work(worker_id):
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        if not run_next_job(worker_id, jobs):
+                            return
+                    except DatabaseError as exc:
+                        # Lock contention (e.g. on SQLite) is part of what we're measuring
+                        with lock:
+                            db_errors.append(exc)
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(work, [f'loadtest-{i}' for i in range(workers)]))
+        failed = jobs.exclude(status=LabelPurchaseJob.STATUS_DONE).count()
+        self.report('Label purchases', latencies, failed, time.perf_counter() - started)
+        if db_errors:
+            self.stdout.write(f'  {len(db_errors)} database error(s) while claiming jobs, e.g. {db_errors[0]}')
+
+    def report(self, name, latencies, errors, elapsed):
+        count = len(latencies)
+        rps = count / elapsed if elapsed else 0
+        self.stdout.write(f'{name}: {count} in {elapsed:.2f}s ({rps:.1f}/s), {errors} error(s)')
+        if latencies:
+            self.stdout.write('  latency ms: p50 %.1f  p95 %.1f  p99 %.1f  max %.1f' % tuple(
+                value * 1000 for value in (
+                    percentile(latencies, 50),
+                    percentile(latencies, 95),
+                    percentile(latencies, 99),
+                    max(latencies),
+                )
+            ))
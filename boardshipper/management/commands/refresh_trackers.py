@@ -0,0 +1,95 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from boardshipper import easypost_client, tracking
+from boardshipper.models import Booking
+from boardshipper.utils import EASYPOST_API_KEY
+
+
+class Command(BaseCommand):
+    help = 'Refresh tracking status from EasyPost for shipments that are still in flight'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent EasyPost requests')
+        parser.add_argument('--rate', type=float, default=None, help='Max EasyPost requests per second')
+        parser.add_argument('--batch-size', type=int, default=500, help='Bookings fetched and saved per batch')
+        parser.add_argument('--checkpoint', default='refresh_trackers.checkpoint',
+                            help='File recording progress so an interrupted run can resume')
+        parser.add_argument('--restart', action='store_true', help='Ignore any saved checkpoint')
+
+    def handle(self, *args, **options):
+        if not EASYPOST_API_KEY:
+            raise CommandError('EASYPOST_API_KEY not configured.')
+        if options['rate'] is not None:
+            easypost_client.set_rate_limit(options['rate'])
+
+        checkpoint = options['checkpoint']
+        last_pk = 0 if options['restart'] else self.read_checkpoint(checkpoint)
+        if last_pk:
+            self.stdout.write(f'Resuming after booking #{last_pk}')
+
+        candidates = (
+            Booking.objects
+            .filter(status=Booking.STATUS_PURCHASED, easypost_shipment_id__isnull=False)
+            .exclude(easypost_shipment_id='')
+            .exclude(current_status__in=tracking.TERMINAL_STATUSES)
+            .only('pk', 'user_id', 'easypost_shipment_id', 'current_status', 'current_status_at', 'version')
+            .order_by('pk')
+        )
+
+        checked = updated = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            while True:
+                batch = list(candidates.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not batch:
+                    break
+                for booking, result in zip(batch, pool.map(self.fetch, batch)):
+                    if isinstance(result, Exception):
+                        failed += 1
+                        self.stderr.write(f'#{booking.pk}: {result}')
+                        continue
+                    if result is None:
+                        continue
+                    status, occurred_at = result
+                    occurred_at = occurred_at or timezone.now()
+                    if booking.current_status_at and occurred_at < booking.current_status_at:
+                        continue
+                    if status != booking.current_status or occurred_at != booking.current_status_at:
+                        # A conditional update, so a newer status from a webhook that
+                        # arrived while this batch was being fetched is kept
+                        updated += tracking.update_status(booking.pk, status, occurred_at)
+                checked += len(batch)
+                last_pk = batch[-1].pk
+                self.write_checkpoint(checkpoint, last_pk)
+                self.stdout.write(f'Checked {checked}, updated {updated}, failed {failed}')
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(f'Done: checked {checked}, updated {updated}, failed {failed}')
+
+    def fetch(self, booking):
+        """Runs in a worker thread; only talks to EasyPost, never the database."""
+        try:
+            resp = easypost_client.get(EASYPOST_API_KEY, f'/v2/shipments/{booking.easypost_shipment_id}')
+            resp.raise_for_status()
+            tracker = resp.json().get('tracker')
+            return tracking.tracker_status(tracker) if tracker else None
+        except Exception as e:
+            return e
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                return int(json.load(f)['last_pk'])
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def write_checkpoint(self, path, last_pk):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'last_pk': last_pk, 'updated_at': timezone.now().isoformat()}, f)
+        os.replace(tmp, path)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from boardshipper.models import Booking
+
+
+class Command(BaseCommand):
+    help = 'Recompute customer prices (shipping_rate_user) from the price matrix'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing-only', action='store_true', help='Only price bookings without a customer price')
+
+    def handle(self, *args, **options):
+        bookings = Booking.objects.all()
+        if options['missing_only']:
+            bookings = bookings.filter(shipping_rate_user__isnull=True)
+        count = bookings.reprice()
+        self.stdout.write(f'Repriced {count} booking(s)')
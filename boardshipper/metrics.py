@@ -0,0 +1,223 @@
+# In-process request, database and EasyPost metrics in Prometheus text format
+
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+# Counts of processes that have exited, kept in METRICS_DIR
+RETIRED_FILE = 'metrics-retired.json'
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HELP = {
+    'boardshipper_requests_total': ('counter', 'HTTP requests by view, method and status code'),
+    'boardshipper_request_duration_seconds': ('histogram', 'Time spent handling a request, by view'),
+    'boardshipper_db_queries_total': ('counter', 'Database queries run while handling requests, by view'),
+    'boardshipper_db_query_seconds_total': ('counter', 'Time spent in database queries, by view'),
+    'boardshipper_cache_requests_total': ('counter', 'Rate, page and fragment cache lookups by kind, name and hit/miss'),
+    'boardshipper_easypost_request_duration_seconds': (
+        'histogram', 'Outbound EasyPost calls including retries and rate limiting, by stage'),
+}
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+class Registry:
+    """
+    Thread-safe counters and histograms for one process.
+
+    With METRICS_DIR set, each process periodically writes a snapshot to its
+    own file there, and collect() sums the snapshots of every process, so the
+    /metrics endpoint sees all web workers no matter which one serves it.
+    Snapshots of processes that have exited are folded into one retired file,
+    so their counts stay in the totals without a file per dead worker.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.last_flush = 0.0
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[_key(name, labels)] += value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, dict(labels), dict(h, buckets=list(h['buckets']))]
+                    for (name, labels), h in self.histograms.items()
+                ],
+            }
+
+    def _path(self):
+        return os.path.join(settings.METRICS_DIR, f'metrics-{os.getpid()}.json')
+
+    def flush(self, force=False):
+        """Write this process's snapshot to METRICS_DIR at most every METRICS_FLUSH_INTERVAL seconds."""
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = self._path()
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def _retire(self, path):
+        """Add an exited process's snapshot to metrics-retired.json and remove its file."""
+        claimed = f'{path}.retiring'
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return  # Another process is retiring it
+        retired_path = os.path.join(settings.METRICS_DIR, RETIRED_FILE)
+        with open(os.path.join(settings.METRICS_DIR, 'retired.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            snapshots = [_load(claimed)]
+            if os.path.exists(retired_path):
+                snapshots.append(_load(retired_path))
+            tmp = f'{retired_path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(_as_snapshot(*_merge(s for s in snapshots if s)), f)
+            os.replace(tmp, retired_path)
+        os.remove(claimed)
+
+    def _snapshots(self):
+        if not settings.METRICS_DIR:
+            return [self.snapshot()]
+        self.flush(force=True)
+        snapshots = []
+        for name in sorted(os.listdir(settings.METRICS_DIR)):
+            if name == RETIRED_FILE or not (name.startswith('metrics-') and name.endswith('.json')):
+                continue
+            path = os.path.join(settings.METRICS_DIR, name)
+            pid = name[len('metrics-'):-len('.json')]
+            if pid.isdigit() and not _alive(int(pid)):
+                self._retire(path)
+                continue
+            snapshot = _load(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        # Read after retiring, so a snapshot retired above is counted exactly once
+        retired = _load(os.path.join(settings.METRICS_DIR, RETIRED_FILE))
+        return snapshots + [retired] if retired else snapshots
+
+    def collect(self):
+        """Counters and histograms summed over every process."""
+        return _merge(self._snapshots())
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, but belongs to another user
+    return True
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Being replaced by its process right now; it'll be there next scrape
+        return None
+
+
+def _merge(snapshots):
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[_key(name, labels)] += value
+        for name, labels, h in snapshot['histograms']:
+            total = histograms.setdefault(
+                _key(name, labels), {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], h['buckets'])]
+            total['sum'] += h['sum']
+            total['count'] += h['count']
+    return counters, histograms
+
+
+def _as_snapshot(counters, histograms):
+    return {
+        'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, dict(labels), h] for (name, labels), h in histograms.items()],
+    }
+
+
+registry = Registry()
+
+
+def _labels(labels, **extra):
+    items = list(labels) + sorted(extra.items())
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+def _number(value):
+    return repr(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    counters, histograms = registry.collect()
+    lines = []
+    for name, (kind, help_text) in HELP.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+            continue
+        for (metric, labels), h in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, h['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {h["count"]}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(h["sum"])}')
+            lines.append(f'{name}_count{_labels(labels)} {h["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def observe_easypost(stage, outcome, seconds):
+    registry.observe('boardshipper_easypost_request_duration_seconds', seconds, stage=stage, outcome=outcome)
+    # Label workers and commands make EasyPost calls outside of any request
+    registry.flush()
@@ -0,0 +1,64 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from .metrics import registry
+from .profiles import get_profile
+
+
+class _QueryCounter:
+    """execute_wrapper that counts queries and the time spent in them"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Record latency, status code and database usage of every request per view"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = _QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.inc('boardshipper_requests_total', view=view, method=request.method, status=str(response.status_code))
+        registry.observe('boardshipper_request_duration_seconds', elapsed, view=view)
+        registry.inc('boardshipper_db_queries_total', queries.count, view=view)
+        registry.inc('boardshipper_db_query_seconds_total', queries.seconds, view=view)
+        registry.flush()
+        return response
+
+
+class ProfileMiddleware:
+    """
+    Set request.profile to the user's UserProfile (or None), loaded lazily from the cache.
+
+    Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_profile(request.user))
+        return self.get_response(request)
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boardshipper', '0008_label_purchase_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='import_batch',
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boardshipper', '0009_booking_import_batch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'created_at'], name='booking_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boardshipper', '0011_tracking_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApiCallLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=50)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('duration_ms', models.PositiveIntegerField()),
+                ('request_bytes', models.PositiveIntegerField(default=0)),
+                ('response_bytes', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='api_calls', to='boardshipper.booking')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['endpoint', 'created_at'], name='apicalllog_endpoint_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boardshipper', '0012_api_call_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='label_file',
+            field=models.FileField(blank=True, upload_to='labels/%Y/%m/'),
+        ),
+    ]
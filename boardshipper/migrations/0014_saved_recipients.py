@@ -0,0 +1,48 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boardshipper', '0013_booking_label_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address_hash', models.CharField(max_length=64)),
+                ('search_name', models.CharField(max_length=201)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('phone', models.CharField(blank=True, max_length=20)),
+                ('street', models.CharField(max_length=200)),
+                ('city', models.CharField(max_length=100)),
+                ('state', models.CharField(max_length=100)),
+                ('zip_code', models.CharField(max_length=20)),
+                ('country', models.CharField(max_length=100)),
+                ('verification', models.CharField(choices=[('unverified', 'Unverified'), ('verified', 'Verified'), ('failed', 'Failed')], default='unverified', max_length=12)),
+                ('verification_message', models.CharField(blank=True, max_length=255)),
+                ('easypost_address_id', models.CharField(blank=True, max_length=100)),
+                ('verified_at', models.DateTimeField(blank=True, null=True)),
+                ('use_count', models.PositiveIntegerField(default=0)),
+                ('last_used_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_recipients', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'search_name'], name='savedrecipient_user_search')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='savedrecipient',
+            constraint=models.UniqueConstraint(fields=('user', 'address_hash'), name='savedrecipient_user_address'),
+        ),
+    ]
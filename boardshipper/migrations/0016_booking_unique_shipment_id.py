@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+def blank_shipment_ids_to_null(apps, schema_editor):
+    # '' would collide under the unique index; NULLs don't
+    Booking = apps.get_model('boardshipper', 'Booking')
+    Booking.objects.filter(easypost_shipment_id='').update(easypost_shipment_id=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boardshipper', '0015_booking_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(blank_shipment_ids_to_null, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='booking',
+            name='easypost_shipment_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+    ]
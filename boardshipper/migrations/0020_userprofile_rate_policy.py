@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boardshipper', '0019_booking_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='rate_carriers',
+            field=models.CharField(blank=True, help_text='Comma-separated carriers to buy from; blank uses the site default', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='rate_max_transit_days',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Skip rates slower than this many days', null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='rate_strategy',
+            field=models.CharField(choices=[('cheapest', 'Cheapest'), ('fastest', 'Fastest')], default='cheapest', max_length=20),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.0.1 on 2026-10-18 14:10
+
+import hashlib
+import re
+
+from django.db import migrations
+
+# boardshipper.recipients.address_hash and the state spellings it relies on,
+# frozen as they were when this migration was written
+STATE_NAMES = {
+    'AL': 'ALABAMA', 'AK': 'ALASKA', 'AZ': 'ARIZONA', 'AR': 'ARKANSAS',
+    'CA': 'CALIFORNIA', 'CO': 'COLORADO', 'CT': 'CONNECTICUT', 'DE': 'DELAWARE',
+    'DC': 'DISTRICT OF COLUMBIA', 'FL': 'FLORIDA', 'GA': 'GEORGIA', 'HI': 'HAWAII',
+    'ID': 'IDAHO', 'IL': 'ILLINOIS', 'IN': 'INDIANA', 'IA': 'IOWA',
+    'KS': 'KANSAS', 'KY': 'KENTUCKY', 'LA': 'LOUISIANA', 'ME': 'MAINE',
+    'MD': 'MARYLAND', 'MA': 'MASSACHUSETTS', 'MI': 'MICHIGAN', 'MN': 'MINNESOTA',
+    'MS': 'MISSISSIPPI', 'MO': 'MISSOURI', 'MT': 'MONTANA', 'NE': 'NEBRASKA',
+    'NV': 'NEVADA', 'NH': 'NEW HAMPSHIRE', 'NJ': 'NEW JERSEY', 'NM': 'NEW MEXICO',
+    'NY': 'NEW YORK', 'NC': 'NORTH CAROLINA', 'ND': 'NORTH DAKOTA', 'OH': 'OHIO',
+    'OK': 'OKLAHOMA', 'OR': 'OREGON', 'PA': 'PENNSYLVANIA', 'RI': 'RHODE ISLAND',
+    'SC': 'SOUTH CAROLINA', 'SD': 'SOUTH DAKOTA', 'TN': 'TENNESSEE', 'TX': 'TEXAS',
+    'UT': 'UTAH', 'VT': 'VERMONT', 'VA': 'VIRGINIA', 'WA': 'WASHINGTON',
+    'WV': 'WEST VIRGINIA', 'WI': 'WISCONSIN', 'WY': 'WYOMING',
+    'PR': 'PUERTO RICO', 'VI': 'VIRGIN ISLANDS', 'GU': 'GUAM',
+}
+SPELLINGS = {
+    **{code: code for code in STATE_NAMES},
+    **{name: code for code, name in STATE_NAMES.items()},
+    'CALIF': 'CA', 'CAL': 'CA', 'ORE': 'OR', 'OREG': 'OR', 'WASH': 'WA',
+    'COLO': 'CO', 'ARIZ': 'AZ', 'IDA': 'ID', 'TEX': 'TX', 'NEV': 'NV',
+}
+
+
+def _clean(value):
+    return re.sub(r'[^a-z0-9 ]', '', re.sub(r'\s+', ' ', (value or '').lower())).strip()
+
+
+def address_hash(street, city, state, zip_code, country, name=''):
+    state_code = SPELLINGS.get((state or '').strip().upper().replace('.', ''), '')
+    is_zip = re.match(r'[0-9]{3}', (zip_code or '').strip()) is not None
+    normalized = '|'.join([
+        _clean(name),
+        _clean(street),
+        _clean(city),
+        state_code or _clean(state),
+        _clean(zip_code).replace(' ', '')[:5] if is_zip else _clean(zip_code),
+        _clean(country),
+    ])
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def rehash_with_name(apps, schema_editor):
+    # address_hash now covers the recipient's name as well as the address
+    SavedRecipient = apps.get_model('boardshipper', 'SavedRecipient')
+    recipients = list(SavedRecipient.objects.only(
+        'first_name', 'last_name', 'street', 'city', 'state', 'zip_code', 'country'))
+    for recipient in recipients:
+        recipient.address_hash = address_hash(
+            recipient.street, recipient.city, recipient.state, recipient.zip_code, recipient.country,
+            name=f'{recipient.first_name} {recipient.last_name}',
+        )
+    SavedRecipient.objects.bulk_update(recipients, ['address_hash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boardshipper', '0020_userprofile_rate_policy'),
+    ]
+
+    operations = [
+        migrations.RunPython(rehash_with_name, migrations.RunPython.noop),
+    ]
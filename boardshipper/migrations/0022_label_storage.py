@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:02
+
+import boardshipper.storage
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import migrations, models
+
+
+def move_labels(apps, schema_editor):
+    # Labels used to be kept under MEDIA_ROOT as labels/%Y/%m/booking-<pk>.<ext>
+    media = FileSystemStorage(location=settings.MEDIA_ROOT)
+    labels = boardshipper.storage.label_storage()
+    Booking = apps.get_model('boardshipper', 'Booking')
+    for pk, name in Booking.objects.exclude(label_file='').values_list('pk', 'label_file').iterator():
+        if labels.exists(name):
+            continue
+        new_name = ''  # Downloaded again from label_url when it is next needed
+        if media.exists(name):
+            with media.open(name, 'rb') as source:
+                new_name = labels.save(boardshipper.storage.label_upload_to(None, name), source)
+            media.delete(name)
+        Booking.objects.filter(pk=pk).update(label_file=new_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boardshipper', '0021_savedrecipient_name_in_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='label_file',
+            field=models.FileField(blank=True, storage=boardshipper.storage.label_storage, upload_to=boardshipper.storage.label_upload_to),
+        ),
+        migrations.RunPython(move_labels, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,31 @@
 from django.db import models
 from django.contrib.auth.models import User
+from .pricing import customer_price, customer_price_expression
+from .storage import label_storage, label_upload_to
+
+def save_versioned(instance, save, *args, **kwargs):
+    """
+    Save a model whose ``version`` field keys cached copies of it.
+
+    Existing rows are bumped with F('version') + 1 in the UPDATE itself, so a
+    save from a stale instance can't write back a version another process has
+    already used. The new value is read back afterwards.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None:
+        kwargs['update_fields'] = {*update_fields, 'version'}
+    if instance._state.adding:
+        instance.version += 1
+        save(*args, **kwargs)
+        return
+    previous = instance.version
+    instance.version = models.F('version') + 1
+    try:
+        save(*args, **kwargs)
+    except Exception:
+        instance.version = previous
+        raise
+    instance.refresh_from_db(fields=['version'])
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -9,10 +35,41 @@ class UserProfile(models.Model):
     state = models.CharField(max_length=100)
     zip_code = models.CharField(max_length=20)
     country = models.CharField(max_length=100)
+    version = models.PositiveIntegerField(default=0, editable=False)  # Bumped on every save; keys cached copies
+    
+    # How labels are bought for this shop (see boardshipper.rate_selection)
+    RATE_STRATEGY_CHEAPEST = 'cheapest'
+    RATE_STRATEGY_FASTEST = 'fastest'
+    RATE_STRATEGY_CHOICES = [
+        (RATE_STRATEGY_CHEAPEST, 'Cheapest'),
+        (RATE_STRATEGY_FASTEST, 'Fastest'),
+    ]
+    rate_strategy = models.CharField(max_length=20, choices=RATE_STRATEGY_CHOICES, default=RATE_STRATEGY_CHEAPEST)
+    rate_carriers = models.CharField(max_length=200, blank=True,
+                                     help_text='Comma-separated carriers to buy from; blank uses the site default')
+    rate_max_transit_days = models.PositiveSmallIntegerField(blank=True, null=True,
+                                                             help_text='Skip rates slower than this many days')
+    
+    def save(self, *args, **kwargs):
+        save_versioned(self, super().save, *args, **kwargs)
     
     def __str__(self):
         return f"{self.business_name} - Profile"
 
+class BookingQuerySet(models.QuerySet):
+    def with_customer_price(self):
+        """Annotate each booking with its customer price, computed in SQL"""
+        return self.annotate(customer_price=customer_price_expression())
+    
+    def reprice(self):
+        """Set shipping_rate_user from the price matrix for every booking in one UPDATE"""
+        from . import caching  # caching imports these models
+        user_ids = set(self.values_list('user_id', flat=True))
+        count = self.update(shipping_rate_user=customer_price_expression(), version=models.F('version') + 1)
+        # update() sends no signals, so the owners' cached pages and ETags are invalidated here
+        caching.bookings_changed(user_ids)
+        return count
+
 class Booking(models.Model):
     # Link to user
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
@@ -52,48 +109,188 @@ class Booking(models.Model):
     
     # EasyPost Integration Fields
     label_url = models.URLField(blank=True, null=True)
+    label_file = models.FileField(upload_to=label_upload_to, storage=label_storage, blank=True)  # Local copy of label_url
     tracking_url = models.URLField(blank=True, null=True)
-    easypost_shipment_id = models.CharField(max_length=100, blank=True, null=True)
+    easypost_shipment_id = models.CharField(max_length=100, blank=True, null=True, unique=True)  # NULL until bought
     shipping_carrier = models.CharField(max_length=50, blank=True, null=True)
     shipping_service = models.CharField(max_length=100, blank=True, null=True)
     shipping_rate = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # Actual EasyPost rate
     shipping_rate_user = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # Customer-facing rate
     
+    # Label purchase status
+    STATUS_PENDING = 'pending'
+    STATUS_PURCHASED = 'purchased'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PURCHASED, 'Purchased'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    
+    # Latest carrier tracking status, kept up to date by EasyPost tracker webhooks
+    tracking_code = models.CharField(max_length=100, blank=True)
+    current_status = models.CharField(max_length=30, blank=True)
+    current_status_at = models.DateTimeField(blank=True, null=True)
+    
+    # Set on bookings created together by a CSV import
+    import_batch = models.CharField(max_length=32, blank=True, db_index=True)
+    
+    # Sent by the booking form; a resubmission with the same key replays the first booking
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True)
+    
     # Timestamp
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save and bulk update; keys cached fragments of the booking
+    version = models.PositiveIntegerField(default=0, editable=False)
+    
+    objects = BookingQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Shipments list: a user's bookings newest first, paged by (created_at, id)
+            models.Index(fields=['user', 'created_at'], name='booking_user_created_idx'),
+            # Admin changelist: newest first, filtered by status or carrier, searched by reference/tracking code
+            models.Index(fields=['created_at'], name='booking_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='booking_status_created_idx'),
+            models.Index(fields=['shipping_carrier', 'created_at'], name='booking_carrier_created_idx'),
+            models.Index(fields=['order_reference'], name='booking_order_reference_idx'),
+            models.Index(fields=['tracking_code'], name='booking_tracking_code_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='booking_user_idempotency_key_uniq'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        save_versioned(self, super().save, *args, **kwargs)
+    
+    def apply_shipment_result(self, result):
+        """Copy the label details returned by create_easypost_shipment onto the booking"""
+        self.label_url = result['label_url']
+        self.tracking_url = result['tracking_url']
+        self.easypost_shipment_id = result['shipment_id']
+        self.tracking_code = result.get('tracking_code') or ''
+        self.shipping_carrier = result.get('carrier', '')
+        self.shipping_service = result.get('service', '')
+        # Store both the actual EasyPost rate and customer price
+        self.shipping_rate = result.get('rate', 0)  # Actual EasyPost rate
+        self.shipping_rate_user = self.get_customer_price()  # Customer-facing price
+        self.status = self.STATUS_PURCHASED
+    
+    def get_current_status_display(self):
+        return self.current_status.replace('_', ' ').capitalize()
     
     def get_customer_price(self):
         """Calculate the price to show to the customer based on board size and destination"""
-        state = self.recipient_state.upper()
-        is_california = state in ['CA', 'CALIFORNIA']
-        is_west_region = state in ['OR', 'OREGON', 'WA', 'WASHINGTON', 'CO', 'COLORADO', 
-                                   'ID', 'IDAHO', 'AZ', 'ARIZONA']
-        
-        if self.box_size == 'shortboard':
-            if is_california:
-                return 55
-            elif is_west_region:
-                return 75
-            else:
-                return 95
-        elif self.box_size == 'midlength':
-            if is_california:
-                return 95
-            elif is_west_region:
-                return 110
-            else:
-                return 195
-        elif self.box_size == 'longboard':
-            if is_california:
-                return 155
-            elif is_west_region:
-                return 175
-            else:
-                # Longboard not available for other states
-                return None
-        else:
-            # Default to shortboard pricing if something goes wrong
-            return 55 if is_california else 75
+        return customer_price(self.box_size, self.recipient_state, self.recipient_zip)
+    
+    def __str__(self):
+        return f"{self.sender_name} - {self.recipient_first_name} {self.recipient_last_name} - {self.created_at.strftime('%Y-%m-%d')}"
+
+
+class LabelPurchaseJob(models.Model):
+    """A queued EasyPost label purchase for a booking, processed by the label worker"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='label_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField()
+    locked_at = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='labeljob_status_run_after'),
+        ]
     
     def __str__(self):
-        return f"{self.sender_name} - {self.recipient_first_name} {self.recipient_last_name} - {self.created_at.strftime('%Y-%m-%d')}"
\ No newline at end of file
+        return f"Label job #{self.pk} for booking #{self.booking_id} ({self.status})"
+
+
+
+class TrackingEvent(models.Model):
+    """A carrier tracking update received from an EasyPost tracker webhook"""
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='tracking_events')
+    event_id = models.CharField(max_length=100, unique=True)  # EasyPost event id, for idempotent ingestion
+    tracker_id = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=30)
+    message = models.CharField(max_length=255, blank=True)
+    occurred_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.booking_id} - {self.status} ({self.event_id})"
+
+
+class ApiCallLog(models.Model):
+    """One outbound EasyPost call, kept for latency and error-rate reporting"""
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name='api_calls')
+    endpoint = models.CharField(max_length=50)  # e.g. create_shipment, buy
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)  # None if no response was received
+    duration_ms = models.PositiveIntegerField()
+    request_bytes = models.PositiveIntegerField(default=0)
+    response_bytes = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['endpoint', 'created_at'], name='apicalllog_endpoint_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.status_code or 'no response'} ({self.duration_ms} ms)"
+
+
+class SavedRecipient(models.Model):
+    """A shop's address book entry, with the result of verifying the address with EasyPost"""
+    VERIFICATION_UNVERIFIED = 'unverified'
+    VERIFICATION_VERIFIED = 'verified'
+    VERIFICATION_FAILED = 'failed'
+    VERIFICATION_CHOICES = [
+        (VERIFICATION_UNVERIFIED, 'Unverified'),
+        (VERIFICATION_VERIFIED, 'Verified'),
+        (VERIFICATION_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_recipients')
+    address_hash = models.CharField(max_length=64)  # sha256 of the normalized name and address
+    search_name = models.CharField(max_length=201)  # lowercased "first last", for prefix search
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+    email = models.EmailField(blank=True)
+    phone = models.CharField(max_length=20, blank=True)
+    street = models.CharField(max_length=200)
+    city = models.CharField(max_length=100)
+    state = models.CharField(max_length=100)
+    zip_code = models.CharField(max_length=20)
+    country = models.CharField(max_length=100)
+    verification = models.CharField(max_length=12, choices=VERIFICATION_CHOICES, default=VERIFICATION_UNVERIFIED)
+    verification_message = models.CharField(max_length=255, blank=True)
+    easypost_address_id = models.CharField(max_length=100, blank=True)
+    verified_at = models.DateTimeField(blank=True, null=True)
+    use_count = models.PositiveIntegerField(default=0)
+    last_used_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'address_hash'], name='savedrecipient_user_address'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'search_name'], name='savedrecipient_user_search'),
+        ]
+
+    def __str__(self):
+        return f"{self.first_name} {self.last_name}, {self.city} {self.state}"
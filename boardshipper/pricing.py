@@ -0,0 +1,63 @@
+# Customer pricing by board type and destination region
+
+from django.db.models import Case, DecimalField, Q, Value, When
+
+from . import zones
+
+CALIFORNIA = 'california'
+WEST = 'west'
+OTHER = 'other'
+
+# States in each priced region; any other destination is OTHER
+REGION_STATES = {
+    CALIFORNIA: ('CA',),
+    WEST: ('OR', 'WA', 'CO', 'ID', 'AZ'),
+}
+REGION_BY_STATE = {
+    state: region for region, states in REGION_STATES.items() for state in states
+}
+
+# Price in USD for each board type and region. None means we don't ship it there.
+PRICE_MATRIX = {
+    'shortboard': {CALIFORNIA: 55, WEST: 75, OTHER: 95},
+    'midlength': {CALIFORNIA: 95, WEST: 110, OTHER: 195},
+    'longboard': {CALIFORNIA: 155, WEST: 175, OTHER: None},
+}
+# Used if a booking somehow has an unknown board type
+FALLBACK_PRICES = {CALIFORNIA: 55, WEST: 75, OTHER: 75}
+
+
+def region_for(zip_code, state):
+    """Pricing region of a destination, classified by ZIP prefix with the typed state as fallback"""
+    return REGION_BY_STATE.get(zones.resolve_state(zip_code, state), OTHER)
+
+
+def customer_price(box_size, state, zip_code=''):
+    """Price to show the customer for a board type shipped to a destination"""
+    return PRICE_MATRIX.get(box_size, FALLBACK_PRICES)[region_for(zip_code, state)]
+
+
+def customer_price_expression(state_field='recipient_state', zip_field='recipient_zip', box_size_field='box_size'):
+    """
+    The price matrix as a single SQL CASE expression.
+
+    Gives the same result as customer_price() for every row, so it can be used
+    in annotate() or update() to price many bookings in one query.
+    """
+    in_region = {
+        region: zones.state_q(zip_field, state_field, states)
+        for region, states in REGION_STATES.items()
+    }
+    whens = []
+    for region in REGION_STATES:
+        for box_size, prices in PRICE_MATRIX.items():
+            whens.append(When(in_region[region] & Q(**{box_size_field: box_size}), then=Value(prices[region])))
+    for box_size, prices in PRICE_MATRIX.items():
+        whens.append(When(Q(**{box_size_field: box_size}), then=Value(prices[OTHER])))
+    for region in REGION_STATES:
+        whens.append(When(in_region[region], then=Value(FALLBACK_PRICES[region])))
+    return Case(
+        *whens,
+        default=Value(FALLBACK_PRICES[OTHER]),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
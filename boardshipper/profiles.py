@@ -0,0 +1,42 @@
+# Cached access to the signed-in user's UserProfile
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from .models import UserProfile
+
+CACHE_TIMEOUT = 3600
+# Cached in place of a profile for users who haven't created one
+NO_PROFILE = 'none'
+
+
+def _cache_key(user_id):
+    return f'profile:{user_id}'
+
+
+def get_profile(user):
+    """
+    The user's UserProfile, or None if they don't have one.
+
+    Profiles are kept in the default cache until they are saved or deleted.
+    """
+    if not user.is_authenticated:
+        return None
+    key = _cache_key(user.pk)
+    profile = cache.get(key)
+    if profile is None:
+        profile = UserProfile.objects.filter(user_id=user.pk).first() or NO_PROFILE
+        cache.set(key, profile, CACHE_TIMEOUT)
+    if profile == NO_PROFILE:
+        return None
+    # Avoid another query when the payload builder reads profile.user.email
+    profile.user = user
+    return profile
+
+
+def invalidate(sender, instance, **kwargs):
+    cache.delete(_cache_key(instance.user_id))
+
+
+post_save.connect(invalidate, sender=UserProfile, dispatch_uid='boardshipper.profiles.invalidate_saved')
+post_delete.connect(invalidate, sender=UserProfile, dispatch_uid='boardshipper.profiles.invalidate_deleted')
@@ -0,0 +1,92 @@
+# Shared cache of EasyPost rate quotes
+#
+# The 'rates' cache lives in the shared default backend (see CACHES in
+# settings), so eviction is that backend's: the file cache culls a random
+# fraction of entries when full, Redis follows its maxmemory-policy. Entries
+# also expire after RATE_CACHE_TTL. A per-process LRU is available with
+# RATE_CACHE_BACKEND set to LocMemCache, at the cost of each worker quoting
+# every lane itself.
+
+import math
+import re
+
+from django.core.cache import caches
+
+from . import zones
+from .metrics import registry
+
+CACHE_ALIAS = 'rates'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def weight_bucket(weight):
+    """Round a weight in pounds up to the next whole pound."""
+    return max(1, math.ceil(float(weight)))
+
+
+def _lane_part(zip_code):
+    # ZIP3 is what carrier zones are based on. Anything else (foreign or
+    # mistyped postal codes) keeps its whole normalized value, so such lanes
+    # don't all share one key.
+    return zones.zip3(zip_code) or re.sub(r'[^0-9A-Z]', '', (zip_code or '').upper())
+
+
+def rate_cache_key(origin_zip, destination_zip, box_size, weight):
+    """
+    Normalized cache key for a lane, box size and weight bucket, or None if
+    either end has no usable postal code and the lane shouldn't be cached.
+    """
+    origin, destination = _lane_part(origin_zip), _lane_part(destination_zip)
+    if not origin or not destination:
+        return None
+    return 'rates:%s:%s:%s:%d' % (
+        origin,
+        destination,
+        (box_size or '').strip().lower(),
+        weight_bucket(weight),
+    )
+
+
+def _count(hit):
+    # Counted alongside the page and fragment caches; see caching.stats()
+    registry.inc('boardshipper_cache_requests_total', kind='rates', fragment='quotes', result='hit' if hit else 'miss')
+
+
+def get_rates(key, count=True):
+    """
+    Return the cached rate list for a key, or None on a miss.
+
+    Pass count=False for lookups that don't stand in for an EasyPost call, so
+    they don't show up in the hit ratio.
+    """
+    if key is None:
+        return None
+    rates = _cache().get(key)
+    if count:
+        _count(rates is not None)
+    return rates
+
+
+def store_rates(key, rates, carrier=None):
+    """
+    Cache the rates returned for a shipment, optionally keeping only one carrier.
+
+    Returns the kept rates; with a None key they are returned without caching.
+    """
+    kept = [
+        {
+            'carrier': rate.get('carrier', ''),
+            'service': rate.get('service', ''),
+            'rate': rate.get('rate'),
+            'delivery_days': rate.get('delivery_days'),
+        }
+        for rate in rates
+        if carrier is None or rate.get('carrier') == carrier
+    ]
+    if key is not None:
+        _cache().set(key, kept)
+    return kept
+
@@ -0,0 +1,63 @@
+# Per-shop rules for choosing which EasyPost rate to buy
+
+import math
+from collections import namedtuple
+
+from django.conf import settings
+
+
+def _price(rate):
+    try:
+        return float(rate.get('rate'))
+    except (TypeError, ValueError):
+        return math.inf
+
+
+def _days(rate):
+    days = rate.get('delivery_days')
+    return days if days is not None else math.inf
+
+
+# Sort keys by strategy name, best rate first. Add an entry here (and to
+# UserProfile.RATE_STRATEGY_CHOICES) to offer another strategy.
+STRATEGIES = {
+    'cheapest': lambda rate: (_price(rate), _days(rate)),
+    'fastest': lambda rate: (_days(rate), _price(rate)),
+}
+
+RatePolicy = namedtuple('RatePolicy', ['strategy', 'carriers', 'max_transit_days'])
+
+
+def _carrier_set(value):
+    return frozenset(carrier.strip().casefold() for carrier in (value or '').split(',') if carrier.strip())
+
+
+def policy_for(profile):
+    """The shop's RatePolicy; a blank carrier list means RATE_DEFAULT_CARRIERS"""
+    carriers = _carrier_set(profile.rate_carriers) or _carrier_set(settings.RATE_DEFAULT_CARRIERS)
+    strategy = profile.rate_strategy if profile.rate_strategy in STRATEGIES else 'cheapest'
+    return RatePolicy(strategy, carriers, profile.rate_max_transit_days)
+
+
+def select_rates(rates, policy):
+    """
+    Rates the policy accepts, best first.
+
+    A rate is dropped if its carrier isn't allowed (an empty allowlist allows
+    every carrier) or if it is slower than max_transit_days. Rates without a
+    delivery estimate are dropped when a maximum is set.
+    """
+    allowed = [
+        rate for rate in rates
+        if (not policy.carriers or (rate.get('carrier') or '').casefold() in policy.carriers)
+        and (policy.max_transit_days is None or _days(rate) <= policy.max_transit_days)
+    ]
+    return sorted(allowed, key=STRATEGIES[policy.strategy])
+
+
+def carrier_accounts(policy):
+    """EASYPOST_CARRIER_ACCOUNTS ids worth asking for rates under this policy"""
+    return [
+        account_id for carrier, account_id in settings.EASYPOST_CARRIER_ACCOUNTS
+        if not policy.carriers or carrier.casefold() in policy.carriers
+    ]
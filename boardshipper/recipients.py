@@ -0,0 +1,136 @@
+# Per-shop address book and cached EasyPost address verification
+
+import hashlib
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import zones
+from .models import SavedRecipient
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_FIELDS = ['id', 'first_name', 'last_name', 'email', 'phone', 'street', 'city', 'state',
+                       'zip_code', 'country', 'verification']
+
+
+def _clean(value):
+    return re.sub(r'[^a-z0-9 ]', '', re.sub(r'\s+', ' ', (value or '').lower())).strip()
+
+
+def address_hash(street, city, state, zip_code, country, name=''):
+    """
+    Hash of a recipient's name and address that ignores case, punctuation, spacing,
+    state spelling and ZIP+4.
+
+    "123 Main St." / "Calif." / "92648-1234" hashes the same as "123 main st" / "CA" / "92648".
+    Different people at one address get separate address book entries.
+    """
+    normalized = '|'.join([
+        _clean(name),
+        _clean(street),
+        _clean(city),
+        zones.normalize_state(state) or _clean(state),
+        _clean(zip_code).replace(' ', '')[:5] if zones.zip3(zip_code) else _clean(zip_code),
+        _clean(country),
+    ])
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def booking_address_hash(booking):
+    return address_hash(booking.recipient_street, booking.recipient_city, booking.recipient_state,
+                        booking.recipient_zip, booking.recipient_country,
+                        name=f'{booking.recipient_first_name} {booking.recipient_last_name}')
+
+
+def matches_booking(recipient, booking):
+    """
+    True if the saved entry holds exactly the booking's recipient details.
+
+    The address hash treats spellings and ZIP+4 as equal and leaves out phone
+    and email, so a verified EasyPost address may only stand in for the
+    booking's recipient when every field EasyPost was sent is the same.
+    """
+    return (
+        recipient.first_name == booking.recipient_first_name
+        and recipient.last_name == booking.recipient_last_name
+        and recipient.email == booking.recipient_email
+        and recipient.phone == booking.recipient_phone
+        and recipient.street == booking.recipient_street
+        and recipient.city == booking.recipient_city
+        and recipient.state == booking.recipient_state
+        and recipient.zip_code == booking.recipient_zip
+        and recipient.country == booking.recipient_country
+    )
+
+
+def failed_recently(recipient):
+    """
+    True if the recipient's address failed verification within ADDRESS_VERIFICATION_FAILURE_TTL.
+
+    Older failures are verified again, so one bad answer can't block an address for good.
+    """
+    if recipient.verification != SavedRecipient.VERIFICATION_FAILED or recipient.verified_at is None:
+        return False
+    return timezone.now() - recipient.verified_at < timedelta(seconds=settings.ADDRESS_VERIFICATION_FAILURE_TTL)
+
+
+def remember(booking, **verification):
+    """
+    Add or refresh the booking's recipient in its user's address book.
+
+    The contact details are updated to the latest booking's; ``verification``
+    fields (verification, verification_message, easypost_address_id,
+    verified_at) are only written when given.
+    """
+    now = timezone.now()
+    defaults = {
+        'search_name': f"{booking.recipient_first_name} {booking.recipient_last_name}".lower().strip()[:201],
+        'first_name': booking.recipient_first_name,
+        'last_name': booking.recipient_last_name,
+        'email': booking.recipient_email,
+        'phone': booking.recipient_phone,
+        'street': booking.recipient_street,
+        'city': booking.recipient_city,
+        'state': booking.recipient_state,
+        'zip_code': booking.recipient_zip,
+        'country': booking.recipient_country,
+        'last_used_at': now,
+        **verification,
+    }
+    recipient, _ = SavedRecipient.objects.update_or_create(
+        user_id=booking.user_id,
+        address_hash=booking_address_hash(booking),
+        defaults=defaults,
+    )
+    SavedRecipient.objects.filter(pk=recipient.pk).update(use_count=F('use_count') + 1)
+    return recipient
+
+
+def known_address(booking):
+    """The user's saved entry for the booking's address, or None"""
+    return (
+        SavedRecipient.objects
+        .filter(user_id=booking.user_id, address_hash=booking_address_hash(booking))
+        .first()
+    )
+
+
+def autocomplete(user, query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Saved recipients whose name starts with ``query``, most used first.
+
+    A prefix match on the indexed search_name column (LIKE 'query%') so it
+    stays a short index range scan however big the address book gets.
+    """
+    query = ' '.join((query or '').lower().split())
+    if not query:
+        return SavedRecipient.objects.none()
+    return (
+        SavedRecipient.objects
+        .filter(user=user, search_name__startswith=query)
+        .order_by('-use_count', '-last_used_at')
+        .values(*AUTOCOMPLETE_FIELDS)[:limit]
+    )
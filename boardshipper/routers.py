@@ -0,0 +1,101 @@
+# Read replica routing for the read-heavy history and reporting pages
+
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+from . import caching
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Alias reads go to while a @read_from_replica view (or its streamed body) runs
+_read_alias = ContextVar('boardshipper_read_alias', default=None)
+
+
+def replica_alias():
+    """The configured replica alias, or None when there isn't one"""
+    alias = settings.DATABASE_REPLICA_ALIAS
+    return alias if alias and alias in settings.DATABASES else None
+
+
+def pinned(user):
+    """
+    True for REPLICA_PIN_SECONDS after one of the user's bookings or their profile changed.
+
+    Until then the replica may not have their write yet, so they read from the
+    primary (read-your-writes). Uses the same per-user change stamp as the
+    fragment cache, so bookings, label purchases and tracking updates all count.
+    """
+    return time.time_ns() - caching.generation(user.pk) < settings.REPLICA_PIN_SECONDS * 1_000_000_000
+
+
+def pin(user):
+    """Start the user's read-your-writes window now, for writes that don't touch their own bookings"""
+    caching.bookings_changed([user.pk])
+
+
+def _stream_using(alias, content):
+    """Yield from a streaming response body with reads routed to ``alias``"""
+    iterator = iter(content)
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _read_alias.reset(token)
+        yield chunk
+
+
+def read_from_replica(view):
+    """
+    Send the view's reads to the replica for safe requests by unpinned users.
+
+    Template responses (the admin's) are rendered inside, since their
+    querysets are only evaluated then; streamed responses keep reading from
+    the replica while the body is sent.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = replica_alias()
+        if alias is None or request.method not in SAFE_METHODS or pinned(request.user):
+            return view(request, *args, **kwargs)
+        token = _read_alias.set(alias)
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        finally:
+            _read_alias.reset(token)
+        if response.streaming:
+            response.streaming_content = _stream_using(alias, response.streaming_content)
+        return response
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Reads go to the alias chosen by @read_from_replica, everything else to default.
+
+    Objects loaded from one database keep using it for related lookups. In
+    production the replica gets its schema through replication; for a local
+    SQLite replica run migrate --database replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,53 @@
+import os
+import secrets
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import storages
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.functional import LazyObject, empty
+
+
+class StaticStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static file names (logo.3f2a1b.jpg) so the web server can
+    cache them for a year. A reference to a file that doesn't exist keeps its
+    plain name (a broken image) instead of turning the page into a 500.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+class _LabelStorage(LazyObject):
+    def _setup(self):
+        self._wrapped = storages['labels']
+
+
+_label_storage = _LabelStorage()
+
+
+@receiver(setting_changed)
+def _reset_label_storage(*, setting, **kwargs):
+    # Booking.label_file keeps the object it was given, so overriding
+    # STORAGES (tests, loadtest_booking) has to reach it through here
+    if setting == 'STORAGES':
+        _label_storage._wrapped = empty
+
+
+def label_storage():
+    """
+    Where local label copies are kept (STORAGES['labels']). It is outside
+    MEDIA_ROOT, so the web server never serves a label; only the label views do.
+    """
+    return _label_storage
+
+
+def label_upload_to(instance, filename):
+    # Labels carry customers' addresses, so their names must not be guessable
+    return f'{timezone.now():%Y/%m}/{secrets.token_hex(16)}{os.path.splitext(filename)[1]}'
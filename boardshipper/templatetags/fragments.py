@@ -0,0 +1,40 @@
+from django import template
+
+from boardshipper import caching
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        request = context.get('request')
+        user_id = request.user.pk if request is not None else None
+        key = caching.fragment_key(self.name, user_id, *(value.resolve(context) for value in self.vary_on))
+        html = caching.get_fragment(self.name, key)
+        if html is None:
+            html = self.nodelist.render(context)
+            caching.set_fragment(key, html)
+        return html
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    Cache a block of a template per signed-in user.
+
+        {% fragment shipment_row booking.pk booking.version %} ... {% endfragment %}
+
+    The first argument names the fragment (for the hit-ratio stats); the rest
+    are resolved and added to the key, so pass whatever changes the output.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, bits[1], [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,47 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from boardshipper import images
+
+register = template.Library()
+
+
+def _srcset(entry, key):
+    return ', '.join(f"{static(variant[key])} {variant['width']}w" for variant in entry['variants'])
+
+
+@register.simple_tag
+def responsive_image(name, alt='', sizes='100vw', loading='lazy', **attrs):
+    """
+    <picture> with WebP and JPEG/PNG srcsets built by build_image_variants.
+
+        {% responsive_image 'images/Blanks.jpg' alt='Door to door' sizes='200px' style='max-width: 200px' %}
+
+    Extra keyword arguments become <img> attributes. Images without variants
+    (Pillow not installed, command not run yet) render as a plain <img>.
+    """
+    entry = images.variants(name)
+    extra = format_html_join('', ' {}="{}"', ((key.replace('_', '-'), value) for key, value in attrs.items()))
+    if not entry:
+        return format_html('<img src="{}" alt="{}" loading="{}"{}>', static(name), alt, loading, extra)
+    largest = entry['variants'][-1]
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="{}" decoding="async"{}>'
+        '</picture>',
+        _srcset(entry, 'webp'), sizes,
+        static(largest['fallback']), _srcset(entry, 'fallback'), sizes, entry['width'], entry['height'],
+        alt, loading, extra,
+    )
+
+
+@register.simple_tag
+def image_variant_url(name, width, kind='webp'):
+    """URL of the narrowest variant at least ``width`` pixels wide, for CSS backgrounds"""
+    entry = images.variants(name)
+    if not entry:
+        return static(name) if kind != 'webp' else ''
+    candidates = [variant for variant in entry['variants'] if variant['width'] >= int(width)]
+    variant = candidates[0] if candidates else entry['variants'][-1]
+    return static(variant[kind])
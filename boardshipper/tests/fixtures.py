@@ -0,0 +1,66 @@
+# Local EasyPost webhook payloads for the tests
+
+import json
+import uuid
+
+from django.utils import timezone
+
+from boardshipper.tracking import sign
+
+TRACKER_STATUSES = [
+    'pre_transit',
+    'in_transit',
+    'out_for_delivery',
+    'delivered',
+]
+
+
+def tracker_event_payload(shipment_id, status='in_transit', tracking_code=None, event_id=None,
+                          occurred_at=None, message=None):
+    """
+    Build a tracker.updated webhook event shaped like the ones EasyPost sends.
+
+    Args:
+        shipment_id: EasyPost shipment id the tracker belongs to
+        status: tracker status, e.g. one of TRACKER_STATUSES
+        event_id: defaults to a new random evt_ id
+        occurred_at: datetime of the latest tracking detail (defaults to now)
+    """
+    occurred_at = occurred_at or timezone.now()
+    tracking_code = tracking_code or 'EZ' + uuid.uuid4().hex[:14].upper()
+    return {
+        'object': 'Event',
+        'id': event_id or 'evt_' + uuid.uuid4().hex,
+        'description': 'tracker.updated',
+        'mode': 'test',
+        'created_at': timezone.now().isoformat(),
+        'result': {
+            'object': 'Tracker',
+            'id': 'trk_' + uuid.uuid4().hex,
+            'shipment_id': shipment_id,
+            'tracking_code': tracking_code,
+            'status': status,
+            'carrier': 'GSO',
+            'updated_at': occurred_at.isoformat(),
+            'tracking_details': [
+                {
+                    'object': 'TrackingDetail',
+                    'status': status,
+                    'message': message or status.replace('_', ' ').capitalize(),
+                    'datetime': occurred_at.isoformat(),
+                    'tracking_location': {'city': 'Los Angeles', 'state': 'CA', 'country': 'US', 'zip': '90001'},
+                },
+            ],
+        },
+    }
+
+
+def signed_webhook_request(payload, secret):
+    """
+    Encode a payload and sign it the way EasyPost does.
+
+    Returns:
+        (body, headers) where headers can be passed to the Django test client
+    """
+    body = json.dumps(payload).encode()
+    return body, {'HTTP_X_HMAC_SIGNATURE': sign(body, secret)}
@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from boardshipper import backends
+from boardshipper.backends import CachedModelBackend
+
+from .utils import seed_shop
+
+
+class CachedModelBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop()
+        cls.user.set_password('old-password')
+        cls.user.save()
+
+    def setUp(self):
+        cache.clear()
+        backends._users.clear()
+        self.addCleanup(backends._users.clear)
+
+    def test_user_is_served_from_the_process_cache(self):
+        backend = CachedModelBackend()
+        self.assertEqual(backend.get_user(str(self.user.pk)), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(str(self.user.pk)), self.user)
+
+    def test_password_hash_stays_out_of_the_shared_cache(self):
+        CachedModelBackend().get_user(str(self.user.pk))
+        for key in cache._cache:
+            self.assertNotIn(self.user.password.encode(), cache._cache[key])
+
+    def test_change_in_another_worker_reloads_the_user(self):
+        backend = CachedModelBackend()
+        backend.get_user(str(self.user.pk))
+        # Another worker saves the user: only the shared version stamp changes here
+        stale = backends._users[str(self.user.pk)]
+        self.user.set_password('new-password')
+        self.user.save()
+        backends._users[str(self.user.pk)] = stale
+        self.assertEqual(backend.get_user(str(self.user.pk)).password, self.user.password)
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.client.login(username=self.user.username, password='old-password')
+        self.assertEqual(self.client.get(reverse('shipments')).status_code, 200)
+        self.user.set_password('new-password')
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('shipments')).status_code, 302)
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from boardshipper import views
+from boardshipper.jobs import run_next_job
+from boardshipper.models import Booking, LabelPurchaseJob
+
+from .utils import FakeEasyPostMixin, seed_shop
+
+BOOKING_DATA = {
+    'recipient_first_name': 'Kai',
+    'recipient_last_name': 'Kahale',
+    'recipient_email': 'kai@example.com',
+    'recipient_phone': '(555) 123-4567',
+    'recipient_street': '123 Pacific Coast Hwy',
+    'recipient_city': 'Huntington Beach',
+    'recipient_state': 'CA',
+    'recipient_zip': '92648',
+    'recipient_country': 'United States',
+    'box_size': 'shortboard',
+    'weight': '12',
+    'idempotency_key': 'a1b2c3d4e5f60718293a4b5c6d7e8f90',
+}
+
+
+class IdempotentBookingTests(FakeEasyPostMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def book(self):
+        return self.client.post(reverse('book'), BOOKING_DATA)
+
+    def bought_shipments(self):
+        return [s for s in self.easypost.shipments.values() if s['selected_rate']]
+
+    def test_resubmitted_key_replays_the_original_booking(self):
+        first = self.book()
+        booking = Booking.objects.get(user=self.user)
+        self.assertRedirects(first, reverse('booking_detail', args=[booking.pk]), fetch_redirect_response=False)
+        while run_next_job('test-worker'):
+            pass
+        self.assertEqual(len(self.bought_shipments()), 1)
+
+        again = self.book()
+        self.assertRedirects(again, reverse('booking_detail', args=[booking.pk]), fetch_redirect_response=False)
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(LabelPurchaseJob.objects.filter(booking__user=self.user).count(), 1)
+        self.assertFalse(run_next_job('test-worker'))
+        self.assertEqual(len(self.bought_shipments()), 1)
+
+    def test_concurrent_insert_resolves_to_the_existing_booking(self):
+        self.book()
+        original = Booking.objects.get(user=self.user)
+        lookups = []
+
+        def not_committed_yet(user, key):
+            # The first lookup runs before the other request's insert is visible
+            lookups.append(key)
+            return None if len(lookups) == 1 else Booking.objects.filter(user=user, idempotency_key=key).first()
+
+        with mock.patch.object(views, '_booking_for_key', side_effect=not_committed_yet):
+            response = self.book()
+        self.assertEqual(len(lookups), 2)
+        self.assertRedirects(response, reverse('booking_detail', args=[original.pk]), fetch_redirect_response=False)
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(LabelPurchaseJob.objects.filter(booking__user=self.user).count(), 1)
@@ -0,0 +1,51 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from boardshipper.models import Booking
+
+from .utils import seed_shop
+
+
+class BookingsConditionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop(bookings=3)
+        cls.other, _ = seed_shop(bookings=1)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.booking = Booking.objects.filter(user=self.user).first()
+
+    def etag(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def pages(self):
+        return [reverse('shipments'), reverse('booking_detail', args=[self.booking.pk])]
+
+    def test_matching_etag_is_not_modified(self):
+        for path in self.pages():
+            with self.subTest(path=path):
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=self.etag(path))
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_saving_a_booking_changes_the_etag(self):
+        for path in self.pages():
+            with self.subTest(path=path):
+                before = self.etag(path)
+                self.booking.additional_info = f'Changed for {path}'
+                self.booking.save()
+                self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=before).status_code, 200)
+                self.assertNotEqual(self.etag(path), before)
+
+    def test_bulk_reprice_changes_the_etag(self):
+        before = self.etag(reverse('shipments'))
+        Booking.objects.filter(user=self.user).reprice()
+        self.assertNotEqual(self.etag(reverse('shipments')), before)
+
+    def test_other_users_changes_keep_the_etag(self):
+        before = self.etag(reverse('shipments'))
+        Booking.objects.filter(user=self.other).first().save()
+        self.assertEqual(self.etag(reverse('shipments')), before)
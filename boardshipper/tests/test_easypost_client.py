@@ -0,0 +1,101 @@
+import io
+import time
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from boardshipper import easypost_client
+
+
+class StubSession:
+    """Answers each request with the next outcome: a status code or an exception to raise"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        response.raw = io.BytesIO(b'{}')
+        return response
+
+
+class NoLimit:
+    def acquire(self):
+        pass
+
+
+@override_settings(EASYPOST_MAX_RETRIES=3, EASYPOST_BACKOFF_FACTOR=0.5, EASYPOST_BACKOFF_MAX=2,
+                   EASYPOST_CONNECT_TIMEOUT=5, EASYPOST_READ_TIMEOUT=30)
+class RetryPolicyTests(SimpleTestCase):
+    def setUp(self):
+        self.enterContext(mock.patch.object(easypost_client, 'get_rate_limiter', return_value=NoLimit()))
+        self.sleep = self.enterContext(mock.patch.object(easypost_client.time, 'sleep'))
+
+    def send(self, *outcomes, idempotent=False, deadline=None):
+        self.session = StubSession(*outcomes)
+        with mock.patch.object(easypost_client, 'get_session', return_value=self.session):
+            return easypost_client.post('EZTKtest', '/v2/shipments', json={}, idempotent=idempotent,
+                                        deadline=deadline)
+
+    def sleeps(self):
+        return [call.args[0] for call in self.sleep.call_args_list]
+
+    def test_server_errors_are_retried_only_when_idempotent(self):
+        for status in (500, 502, 503, 504):
+            with self.subTest(status=status):
+                self.assertEqual(self.send(status, 200, idempotent=True).status_code, 200)
+                self.assertEqual(len(self.session.calls), 2)
+                self.assertEqual(self.send(status, 200).status_code, status)
+                self.assertEqual(len(self.session.calls), 1)
+
+    def test_rate_limited_calls_are_always_retried(self):
+        self.assertEqual(self.send(429, 200).status_code, 200)
+        self.assertEqual(len(self.session.calls), 2)
+
+    def test_client_errors_are_not_retried(self):
+        for status in (400, 401, 404, 422):
+            with self.subTest(status=status):
+                self.assertEqual(self.send(status, 200, idempotent=True).status_code, status)
+                self.assertEqual(len(self.session.calls), 1)
+
+    def test_backoff_doubles_up_to_the_cap_then_gives_up(self):
+        self.assertEqual(self.send(503, 503, 503, 503, 200, idempotent=True).status_code, 503)
+        self.assertEqual(len(self.session.calls), 4)
+        self.assertEqual(self.sleeps(), [0.5, 1.0, 2])
+
+    def test_connect_failures_are_retried_for_any_call(self):
+        for error in (requests.exceptions.ConnectTimeout(), requests.exceptions.ConnectionError('Name resolution failed')):
+            with self.subTest(error=error):
+                self.assertEqual(self.send(error, 200).status_code, 200)
+
+    def test_possibly_sent_requests_are_not_retried_unless_idempotent(self):
+        for error in (requests.exceptions.ReadTimeout(), requests.exceptions.ConnectionError('Connection aborted.')):
+            with self.subTest(error=error):
+                with self.assertRaises(type(error)):
+                    self.send(error, 200)
+                self.assertEqual(len(self.session.calls), 1)
+                self.assertEqual(self.send(error, 200, idempotent=True).status_code, 200)
+
+    def test_connection_errors_raise_once_retries_run_out(self):
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.send(*[requests.exceptions.ConnectionError('refused')] * 4)
+        self.assertEqual(len(self.session.calls), 4)
+
+    def test_deadline_caps_timeouts_and_backoff(self):
+        self.send(503, 200, idempotent=True, deadline=time.monotonic() + 0.3)
+        connect_timeout, read_timeout = self.session.calls[0]['timeout']
+        self.assertLessEqual(connect_timeout, 0.3)
+        self.assertLessEqual(read_timeout, 0.3)
+        self.assertLessEqual(self.sleeps()[0], 0.3)
+
+    def test_passed_deadline_raises_without_sending(self):
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.send(200, idempotent=True, deadline=time.monotonic() - 1)
+        self.assertEqual(self.session.calls, [])
@@ -0,0 +1,50 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from boardshipper.imports import CSV_FIELDS
+from boardshipper.models import Booking, LabelPurchaseJob
+
+from .utils import seed_shop
+
+ROW = ['Kai', 'Kahale', 'kai@example.com', '555-0100', '123 Main St', 'Huntington Beach', 'CA',
+       '92648', 'United States', 'shortboard', '5', 'PO-1', '']
+
+
+def csv_bytes(*lines):
+    return '\n'.join([','.join(CSV_FIELDS)] + [','.join(line) for line in lines]).encode() + b'\n'
+
+
+class ImportViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, content):
+        return self.client.post(reverse('import_bookings'),
+                                {'file': SimpleUploadedFile('bookings.csv', content, 'text/csv')})
+
+    def test_valid_rows_are_imported_and_queued(self):
+        response = self.upload(csv_bytes(ROW))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['error'])
+        self.assertEqual(response.context['imported'], 1)
+        booking = Booking.objects.get(user=self.user)
+        self.assertTrue(LabelPurchaseJob.objects.filter(booking=booking).exists())
+
+    def test_non_utf8_file_is_a_form_error(self):
+        response = self.upload(csv_bytes(ROW[:4] + ['123 Café St'] + ROW[5:]).replace(b'\xc3\xa9', b'\xe9'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("isn't UTF-8", response.context['error'])
+        self.assertFalse(Booking.objects.filter(user=self.user).exists())
+
+    def test_malformed_csv_is_a_form_error(self):
+        response = self.upload(csv_bytes(ROW, ['x' * 200000]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Line 3: not a valid CSV file', response.context['error'])
+        # Rows before the bad line are still imported and reported
+        self.assertEqual(response.context['imported'], 1)
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 1)
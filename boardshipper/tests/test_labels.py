@@ -0,0 +1,65 @@
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+from django.urls import reverse
+
+from boardshipper import labels, storage
+from boardshipper.benchmarks import sample_bookings
+from boardshipper.models import Booking
+
+from .utils import seed_shop
+
+LABEL_URL = 'https://easypost-files.example.com/files/postage_label/label.png'
+
+
+class LabelStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop()
+        cls.booking = sample_bookings(cls.user, 1, start_pk=None)[0]
+        cls.booking.label_url = LABEL_URL
+        cls.booking.save()
+
+    def setUp(self):
+        location = tempfile.mkdtemp(prefix='labels-')
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        self.storage = FileSystemStorage(location=location)
+        patcher = mock.patch.object(Booking._meta.get_field('label_file'), 'storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def stored(self):
+        booking = Booking.objects.get(pk=self.booking.pk)
+        self.assertTrue(labels.store_label(booking, b'label'))
+        return booking
+
+    def test_labels_have_unguessable_names_outside_media_root(self):
+        booking = self.stored()
+        self.assertRegex(booking.label_file.name, r'^\d{4}/\d{2}/[0-9a-f]{32}\.png$')
+        self.assertNotEqual(os.path.basename(self.stored().label_file.name), os.path.basename(booking.label_file.name))
+        location = os.path.realpath(storage.label_storage().location)
+        self.assertFalse(location.startswith(os.path.realpath(settings.MEDIA_ROOT) + os.sep))
+
+    def test_missing_file_is_downloaded_again(self):
+        self.storage.delete(self.stored().label_file.name)
+        with mock.patch.object(labels, 'fetch_label', return_value=b'again'):
+            response = self.client.get(reverse('booking_label', args=[self.booking.pk]))
+        self.assertEqual(b''.join(response.streaming_content), b'again')
+
+    def test_missing_file_falls_back_to_label_url(self):
+        self.storage.delete(self.stored().label_file.name)
+        with mock.patch.object(labels, 'fetch_label', side_effect=requests.ConnectionError), \
+                self.assertLogs('boardshipper.labels', 'WARNING'):
+            response = self.client.get(reverse('booking_label', args=[self.booking.pk]))
+            self.assertRedirects(response, LABEL_URL, fetch_redirect_response=False)
+            archive = b''.join(labels.iter_zip(Booking.objects.filter(pk=self.booking.pk)))
+        self.assertEqual(zipfile.ZipFile(io.BytesIO(archive)).namelist(), [])
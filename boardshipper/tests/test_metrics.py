@@ -0,0 +1,50 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from boardshipper import metrics
+
+
+def exited_pid():
+    worker = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                            capture_output=True, text=True, check=True)
+    return int(worker.stdout)
+
+
+class MetricsDirTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='metrics-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(METRICS_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.registry = metrics.Registry()
+
+    def write_snapshot(self, pid, requests):
+        registry = metrics.Registry()
+        registry.inc('boardshipper_requests_total', requests, view='home')
+        with open(os.path.join(self.directory, f'metrics-{pid}.json'), 'w') as f:
+            json.dump(registry.snapshot(), f)
+
+    def requests_total(self):
+        counters, _ = self.registry.collect()
+        return counters[metrics._key('boardshipper_requests_total', {'view': 'home'})]
+
+    def test_exited_workers_are_retired_without_losing_counts(self):
+        self.write_snapshot(exited_pid(), 3)
+        self.write_snapshot(os.getppid(), 4)
+        self.assertEqual(self.requests_total(), 7)
+        self.assertEqual(self.requests_total(), 7)
+        self.assertCountEqual([name for name in os.listdir(self.directory) if name.endswith('.json')],
+                              [f'metrics-{os.getpid()}.json', f'metrics-{os.getppid()}.json', metrics.RETIRED_FILE])
+
+    def test_retired_counts_accumulate(self):
+        self.write_snapshot(exited_pid(), 2)
+        self.assertEqual(self.requests_total(), 2)
+        self.write_snapshot(exited_pid(), 5)
+        self.assertEqual(self.requests_total(), 7)
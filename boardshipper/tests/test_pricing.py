@@ -0,0 +1,37 @@
+import itertools
+from decimal import Decimal
+
+from django.test import TestCase
+
+from boardshipper.benchmarks import sample_bookings
+from boardshipper.models import Booking
+from boardshipper.pricing import PRICE_MATRIX
+
+from .utils import seed_shop
+
+BOX_SIZES = [*PRICE_MATRIX, 'bodyboard']
+STATES = ['CA', 'ca', 'Calif.', 'California', ' OR ', 'Ore.', 'wa', 'Colorado', 'ID', 'az', 'NY', 'tex', '', 'XX']
+ZIP_CODES = ['92648', '92648-1234', ' 97201', '98101', '80202', '83702', '85001', '10001', '96799',
+             '', 'ABCDE', '926', '92', 'SW1A 1AA']
+
+
+class PriceExpressionTests(TestCase):
+    """customer_price_expression() must price every row exactly like Booking.get_customer_price()"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user, _ = seed_shop()
+        combinations = list(itertools.product(BOX_SIZES, STATES, ZIP_CODES))
+        bookings = sample_bookings(user, len(combinations), start_pk=None)
+        for booking, (box_size, state, zip_code) in zip(bookings, combinations):
+            booking.box_size, booking.recipient_state, booking.recipient_zip = box_size, state, zip_code
+        Booking.objects.bulk_create(bookings)
+        cls.user = user
+
+    def test_sql_price_matches_python_price(self):
+        bookings = Booking.objects.filter(user=self.user).with_customer_price()
+        self.assertEqual(len(bookings), len(BOX_SIZES) * len(STATES) * len(ZIP_CODES))
+        for booking in bookings:
+            with self.subTest(box_size=booking.box_size, state=booking.recipient_state, zip=booking.recipient_zip):
+                expected = booking.get_customer_price()
+                self.assertEqual(booking.customer_price, None if expected is None else Decimal(expected))
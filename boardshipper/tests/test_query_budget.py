@@ -0,0 +1,60 @@
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+
+from boardshipper.benchmarks import booking_form_data
+from boardshipper.models import Booking
+
+from .utils import QueryBudgetMixin, seed_shop
+
+# Bookings per shop, enough for every planner to prefer an index
+SEED_BOOKINGS = 2000
+
+
+# Everything on the primary; replica routing has its own tests
+@override_settings(DATABASE_REPLICA_ALIAS=None)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.staff = seed_shop(bookings=SEED_BOOKINGS)
+        cls.booking = Booking.objects.filter(user=cls.user).order_by('-created_at', '-pk').first()
+
+    def setUp(self):
+        # Every page is measured with cold caches
+        cache.clear()
+        caches['fragments'].clear()
+        self.client.force_login(self.user)
+
+    def assertPageWithin(self, max_queries, path, method='get', data=None):
+        with self.assertQueryBudget(max_queries):
+            response = getattr(self.client, method)(path, data) if data else getattr(self.client, method)(path)
+        self.assertLess(response.status_code, 400)
+        return response
+
+    def test_book_form(self):
+        self.assertPageWithin(2, '/book/')
+
+    def test_book_submit(self):
+        self.assertPageWithin(7, '/book/', 'post', booking_form_data())
+
+    def test_booking_detail(self):
+        self.assertPageWithin(3, f'/booking/{self.booking.pk}/')
+
+    def test_shipments(self):
+        self.assertPageWithin(3, '/shipments/')
+
+    def test_shipments_older_page(self):
+        oldest = Booking.objects.filter(user=self.user).order_by('created_at', 'pk').first()
+        cursor = f'{int(oldest.created_at.timestamp() * 1_000_000) + 1}.{oldest.pk}'
+        self.assertPageWithin(3, f'/shipments/?before={cursor}')
+
+    def test_admin_booking_changelist(self):
+        self.client.force_login(self.staff)
+        self.assertPageWithin(6, '/admin/boardshipper/booking/')
+
+    def test_admin_changelist_status_filter(self):
+        self.client.force_login(self.staff)
+        self.assertPageWithin(6, '/admin/boardshipper/booking/?status__exact=failed')
+
+    def test_admin_changelist_search(self):
+        self.client.force_login(self.staff)
+        self.assertPageWithin(6, f'/admin/boardshipper/booking/?q={self.booking.easypost_shipment_id}')
@@ -0,0 +1,71 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from boardshipper import caching, rate_cache, utils
+
+from .utils import seed_shop
+
+RATES = [{'id': 'rate_1', 'carrier': 'GSO', 'service': 'Ground', 'rate': '21.40', 'delivery_days': 3}]
+LANE = {'recipient_state': 'CA', 'recipient_zip': '92648', 'box_size': 'shortboard', 'weight': '5'}
+
+
+@mock.patch.object(utils, 'EASYPOST_API_KEY', 'EZTKtest')
+class QuoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop()
+
+    def setUp(self):
+        caches[rate_cache.CACHE_ALIAS].clear()
+        self.client.force_login(self.user)
+        patcher = mock.patch.object(utils, '_shop_rates', return_value=(RATES, False, True))
+        self.shop_rates = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def quote(self, **fields):
+        return self.client.get(reverse('quote'), {**LANE, **fields})
+
+    def test_quotes_are_shared_through_the_rate_cache(self):
+        self.assertEqual(self.quote().json(), {'available': True, 'price': 55, 'delivery_days': 3})
+        self.assertEqual(self.quote(weight='4.5').json()['price'], 55)
+        self.assertEqual(self.shop_rates.call_count, 1)
+
+    def test_incomplete_zip_is_not_quoted(self):
+        for partial in ('9', '926', '9264', 'ABCDE'):
+            with self.subTest(zip=partial):
+                response = self.quote(recipient_zip=partial)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipient_zip', response.json()['errors'])
+        self.shop_rates.assert_not_called()
+
+    def test_lane_without_a_price_is_not_quoted(self):
+        response = self.quote(recipient_state='NY', recipient_zip='10001', box_size='longboard')
+        self.assertEqual(response.json(), {'available': False, 'price': None, 'delivery_days': None})
+        self.shop_rates.assert_not_called()
+
+    def test_booking_lookup_is_not_counted(self):
+        key = rate_cache.rate_cache_key('92672', '92648', 'shortboard', 5)
+        before = caching.stats().get(('rates', 'quotes'), {'hits': 0, 'misses': 0})
+        self.assertIsNone(rate_cache.get_rates(key, count=False))
+        self.assertEqual(caching.stats().get(('rates', 'quotes'), {'hits': 0, 'misses': 0}), before)
+
+
+class RateCacheKeyTests(SimpleTestCase):
+    def test_us_lanes_share_a_key_per_zip3(self):
+        self.assertEqual(rate_cache.rate_cache_key('92672', '92648', 'Shortboard', 4.2),
+                         rate_cache.rate_cache_key(' 92601', '92648-1234', 'shortboard', 5))
+
+    def test_other_postal_codes_keep_their_full_value(self):
+        self.assertNotEqual(rate_cache.rate_cache_key('92672', 'SW1A 1AA', 'shortboard', 5),
+                            rate_cache.rate_cache_key('92672', 'V6B 1A1', 'shortboard', 5))
+        self.assertEqual(rate_cache.rate_cache_key('92672', 'sw1a 1aa', 'shortboard', 5),
+                         rate_cache.rate_cache_key('92672', 'SW1A1AA', 'shortboard', 5))
+
+    def test_lanes_without_a_postal_code_are_not_cached(self):
+        key = rate_cache.rate_cache_key('92672', ' ', 'shortboard', 5)
+        self.assertIsNone(key)
+        self.assertEqual(len(rate_cache.store_rates(key, RATES)), 1)
+        self.assertIsNone(rate_cache.get_rates(key))
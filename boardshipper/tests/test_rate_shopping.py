@@ -0,0 +1,97 @@
+import time
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from boardshipper import rate_cache, rate_selection, utils
+from boardshipper.benchmarks import sample_bookings
+
+from .utils import FakeEasyPostMixin, seed_shop
+
+CARRIER_ACCOUNTS = [('GSO', 'ca_gso'), ('USPS', 'ca_usps'), ('UPS', 'ca_ups')]
+
+
+class RateShoppingTests(FakeEasyPostMixin, TestCase):
+    fake_easypost_options = {
+        'carrier_accounts': {account_id: carrier for carrier, account_id in CARRIER_ACCOUNTS},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop()
+
+    def setUp(self):
+        super().setUp()
+        caches[rate_cache.CACHE_ALIAS].clear()
+        self.profile = self.user.profile
+        self.booking = sample_bookings(self.user, 1, start_pk=None)[0]
+
+    def best(self, strategy, carriers='GSO,USPS,UPS', max_transit_days=None):
+        self.profile.rate_strategy = strategy
+        self.profile.rate_carriers = carriers
+        self.profile.rate_max_transit_days = max_transit_days
+        rate = utils.quote_shipping_rates(self.profile, self.booking)[0]
+        return rate['carrier'], rate['service']
+
+    def test_strategies_pick_the_expected_rate(self):
+        cases = [
+            (('cheapest',), ('GSO', 'Ground')),
+            (('fastest',), ('GSO', 'PriorityOvernight')),
+            (('cheapest', 'USPS,UPS'), ('USPS', 'GroundAdvantage')),
+            (('fastest', 'usps, ups'), ('UPS', 'Ground')),
+            (('cheapest', 'USPS,UPS', 3), ('UPS', 'Ground')),
+        ]
+        for args, expected in cases:
+            with self.subTest(args=args):
+                self.assertEqual(self.best(*args), expected)
+
+    def test_blank_carrier_list_uses_the_default_carriers(self):
+        with override_settings(RATE_DEFAULT_CARRIERS='UPS'):
+            self.assertEqual(self.best('cheapest', carriers=''), ('UPS', 'Ground'))
+
+    def test_no_acceptable_rate_is_an_empty_quote(self):
+        self.profile.rate_carriers = 'USPS'
+        self.profile.rate_max_transit_days = 1
+        self.assertEqual(utils.quote_shipping_rates(self.profile, self.booking), [])
+
+
+@override_settings(EASYPOST_CARRIER_ACCOUNTS=CARRIER_ACCOUNTS, RATE_SHOPPING_DEADLINE=0.5)
+class RateShoppingDeadlineTests(FakeEasyPostMixin, TestCase):
+    fake_easypost_options = {
+        'carrier_accounts': {account_id: carrier for carrier, account_id in CARRIER_ACCOUNTS},
+        'carrier_latency': {'UPS': 3},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop()
+
+    def setUp(self):
+        super().setUp()
+        caches[rate_cache.CACHE_ALIAS].clear()
+        self.booking = sample_bookings(self.user, 1, start_pk=None)[0]
+        self.policy = rate_selection.RatePolicy('cheapest', frozenset({'gso', 'usps', 'ups'}), None)
+
+    def test_slow_carrier_is_dropped_at_the_deadline(self):
+        payload = utils.build_shipment_payload(self.user.profile, self.booking)
+        started = time.monotonic()
+        rates, partial, complete = utils._shop_rates(payload, self.booking, self.policy)
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual({rate['carrier'] for rate in rates}, {'GSO', 'USPS'})
+        self.assertTrue(partial)
+        self.assertFalse(complete)
+
+    def test_partial_quote_is_not_cached(self):
+        self.user.profile.rate_carriers = 'GSO,USPS,UPS'
+        rates = utils.quote_shipping_rates(self.user.profile, self.booking)
+        self.assertEqual(rates[0]['carrier'], 'GSO')
+        key = utils._rate_key(self.user.profile, self.booking)
+        self.assertIsNone(rate_cache.get_rates(key, count=False))
+
+    def test_all_carriers_answering_is_complete(self):
+        self.policy = rate_selection.RatePolicy('cheapest', frozenset({'gso', 'usps'}), None)
+        payload = utils.build_shipment_payload(self.user.profile, self.booking)
+        with override_settings(EASYPOST_CARRIER_ACCOUNTS=CARRIER_ACCOUNTS[:2]):
+            rates, partial, complete = utils._shop_rates(payload, self.booking, self.policy)
+        self.assertEqual(len({rate['shipment_id'] for rate in rates}), 2)
+        self.assertEqual((partial, complete), (False, True))
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from boardshipper import recipients, utils
+from boardshipper.benchmarks import sample_bookings
+from boardshipper.models import SavedRecipient
+
+from .utils import FakeEasyPostMixin, seed_shop
+
+
+class AddressBookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop()
+
+    def booking(self, first_name='Kai', **fields):
+        booking = sample_bookings(self.user, 1, start_pk=None)[0]
+        booking.recipient_first_name = first_name
+        for name, value in fields.items():
+            setattr(booking, name, value)
+        return booking
+
+    def test_address_hash_ignores_formatting(self):
+        self.assertEqual(
+            recipients.address_hash('123 Main St.', 'Huntington  Beach', 'Calif.', '92648-1234', 'United States'),
+            recipients.address_hash('123 main st', 'huntington beach', 'CA', '92648', 'united states'),
+        )
+
+    def test_contacts_at_one_address_are_kept_apart(self):
+        recipients.remember(self.booking('Kai'))
+        recipients.remember(self.booking('Leilani'))
+        self.assertEqual(
+            sorted(SavedRecipient.objects.filter(user=self.user).values_list('first_name', flat=True)),
+            ['Kai', 'Leilani'],
+        )
+
+    def test_same_contact_is_updated_in_place(self):
+        recipients.remember(self.booking(recipient_phone='111'))
+        recipients.remember(self.booking(recipient_phone='222'))
+        saved = SavedRecipient.objects.get(user=self.user)
+        self.assertEqual((saved.phone, saved.use_count), ('222', 2))
+
+    @override_settings(ADDRESS_VERIFICATION_FAILURE_TTL=3600)
+    def test_verification_failures_expire(self):
+        saved = recipients.remember(self.booking(), verification=SavedRecipient.VERIFICATION_FAILED,
+                                    verified_at=timezone.now() - timedelta(minutes=5))
+        self.assertTrue(recipients.failed_recently(saved))
+        saved.verified_at = timezone.now() - timedelta(hours=2)
+        self.assertFalse(recipients.failed_recently(saved))
+
+    def test_verified_addresses_never_count_as_failed(self):
+        saved = recipients.remember(self.booking(), verification=SavedRecipient.VERIFICATION_VERIFIED,
+                                    verified_at=timezone.now())
+        self.assertFalse(recipients.failed_recently(saved))
+
+
+class VerifiedAddressTests(FakeEasyPostMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop()
+
+    def booking(self, **fields):
+        booking = sample_bookings(self.user, 1, start_pk=None)[0]
+        for name, value in fields.items():
+            setattr(booking, name, value)
+        return booking
+
+    def test_unchanged_recipient_reuses_the_verified_address(self):
+        first = utils.verified_address_id(self.booking())
+        self.assertEqual(utils.verified_address_id(self.booking()), first)
+        self.assertEqual(len(self.easypost.addresses), 1)
+
+    def test_changed_contact_details_are_verified_again(self):
+        first = utils.verified_address_id(self.booking(recipient_phone='111'))
+        for fields in ({'recipient_phone': '222'}, {'recipient_email': 'new@example.com'},
+                       {'recipient_zip': '92648-1234'}):
+            with self.subTest(**fields):
+                address_id = utils.verified_address_id(self.booking(**fields))
+                self.assertNotEqual(address_id, first)
+                address = self.easypost.addresses[address_id]
+                self.assertEqual(address['phone'], fields.get('recipient_phone', address['phone']))
+                self.assertEqual(address['email'], fields.get('recipient_email', address['email']))
+        # Still one address book entry, now holding the latest verified address
+        saved = SavedRecipient.objects.get(user=self.user)
+        self.assertEqual(saved.easypost_address_id, address_id)
@@ -0,0 +1,84 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from boardshipper import tracking
+from boardshipper.benchmarks import sample_bookings
+from boardshipper.management.commands import refresh_trackers
+from boardshipper.models import Booking
+
+from .utils import FakeEasyPostMixin, seed_shop
+
+
+class InlineExecutor:
+    """ThreadPoolExecutor stand-in that runs calls in the test's thread and database connection"""
+
+    def __init__(self, max_workers=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+
+class RefreshTrackersTests(FakeEasyPostMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = seed_shop()
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(refresh_trackers, 'EASYPOST_API_KEY', 'EZTKtest'))
+        shipment = self.easypost.create_shipment({})
+        self.easypost.buy(shipment['id'], {'rate': {'id': shipment['rates'][0]['id']}})
+        self.tracker = shipment['tracker']
+        booking = sample_bookings(self.user, 1, start_pk=None)[0]
+        booking.status = Booking.STATUS_PURCHASED
+        booking.easypost_shipment_id = shipment['id']
+        booking.current_status = 'pre_transit'
+        booking.current_status_at = timezone.now() - timedelta(days=2)
+        booking.save()
+        self.booking = booking
+
+    def track(self, status, occurred):
+        self.tracker['status'] = status
+        self.tracker['tracking_details'] = [{'status': status, 'datetime': occurred}]
+
+    def refresh(self):
+        checkpoint = os.path.join(tempfile.mkdtemp(prefix='trackers-'), 'checkpoint')
+        call_command('refresh_trackers', checkpoint=checkpoint, workers=1, stdout=StringIO(), stderr=StringIO())
+        self.booking.refresh_from_db()
+
+    def test_naive_timestamps_are_read_as_utc(self):
+        occurred = (timezone.now() - timedelta(hours=1)).astimezone(dt_timezone.utc).replace(tzinfo=None)
+        self.track('in_transit', occurred.isoformat())
+        self.refresh()
+        self.assertEqual(self.booking.current_status, 'in_transit')
+        self.assertEqual(self.booking.current_status_at, occurred.replace(tzinfo=dt_timezone.utc))
+
+    def test_webhook_during_the_poll_is_not_overwritten(self):
+        self.track('in_transit', (timezone.now() - timedelta(hours=1)).isoformat())
+        fetch = refresh_trackers.Command.fetch
+
+        def fetch_then_webhook(command, booking):
+            result = fetch(command, booking)
+            tracking.update_status(booking.pk, 'out_for_delivery', timezone.now())
+            return result
+
+        with mock.patch.object(refresh_trackers.Command, 'fetch', fetch_then_webhook), \
+                mock.patch.object(refresh_trackers, 'ThreadPoolExecutor', InlineExecutor):
+            version = Booking.objects.get(pk=self.booking.pk).version
+            self.refresh()
+        self.assertEqual(self.booking.current_status, 'out_for_delivery')
+        self.assertEqual(self.booking.version, version + 1)
@@ -0,0 +1,81 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from boardshipper import caching
+from boardshipper.benchmarks import booking_form_data
+from boardshipper.models import Booking, UserProfile
+
+from .utils import record_queries, seed_shop
+
+
+class ReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.staff = seed_shop(bookings=5)
+        # What replication would have copied
+        users = [cls.user.pk, cls.staff.pk]
+        User.objects.using('replica').bulk_create(list(User.objects.filter(pk__in=users)))
+        UserProfile.objects.using('replica').bulk_create(list(UserProfile.objects.filter(user__in=users)))
+        Booking.objects.using('replica').bulk_create(list(Booking.objects.filter(user__in=users)))
+
+    def setUp(self):
+        # The seeded users' change stamps are brand new; move them out of the pin window
+        past = time.time_ns() - int(settings.REPLICA_PIN_SECONDS * 2 * 1_000_000_000)
+        for user in (self.user, self.staff):
+            cache.set(caching._generation_key(user.pk), past, None)
+        self.booking = Booking.objects.filter(user=self.user).order_by('-created_at', '-pk').first()
+
+    def request(self, user, method, path, data=None):
+        """Make a request as ``user`` and return (response, aliases it read or wrote)"""
+        self.client.force_login(user)
+        with record_queries() as recorder:
+            response = getattr(self.client, method)(path, data) if data else getattr(self.client, method)(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+        return response, recorder.aliases()
+
+    def test_shipments_reads_from_replica(self):
+        _, aliases = self.request(self.user, 'get', '/shipments/')
+        self.assertEqual(aliases, {'replica'})
+
+    def test_booking_detail_reads_from_replica(self):
+        _, aliases = self.request(self.user, 'get', f'/booking/{self.booking.pk}/')
+        self.assertEqual(aliases, {'replica'})
+
+    def test_export_streams_from_replica(self):
+        _, aliases = self.request(self.user, 'get', '/shipments/export/?format=csv')
+        self.assertEqual(aliases, {'replica'})
+
+    def test_admin_changelist_reads_from_replica(self):
+        _, aliases = self.request(self.staff, 'get', '/admin/boardshipper/booking/')
+        self.assertEqual(aliases, {'replica'})
+
+    def test_booking_form_uses_primary(self):
+        _, aliases = self.request(self.user, 'get', '/book/')
+        self.assertLessEqual(aliases, {'default'})
+
+    def test_new_booking_pins_user_to_primary(self):
+        _, aliases = self.request(self.user, 'post', '/book/', booking_form_data())
+        self.assertEqual(aliases, {'default'})
+        created = Booking.objects.filter(user=self.user).latest('pk')
+        self.assertFalse(Booking.objects.using('replica').filter(pk=created.pk).exists())
+
+        # The replica hasn't got the new booking, so the next pages must come from the primary
+        response, aliases = self.request(self.user, 'get', '/shipments/')
+        self.assertEqual(aliases, {'default'})
+        self.assertContains(response, f'/booking/{created.pk}/')
+        _, aliases = self.request(self.user, 'get', f'/booking/{created.pk}/')
+        self.assertEqual(aliases, {'default'})
+
+    def test_unpinned_after_window(self):
+        self.request(self.user, 'post', '/book/', booking_form_data())
+        self.setUp()
+        _, aliases = self.request(self.user, 'get', '/shipments/')
+        self.assertEqual(aliases, {'replica'})
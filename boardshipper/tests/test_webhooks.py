@@ -0,0 +1,125 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from boardshipper.benchmarks import sample_bookings
+from boardshipper.models import TrackingEvent
+from boardshipper.tracking import sign
+
+from .fixtures import signed_webhook_request, tracker_event_payload
+
+SECRET = 'whsec_test'
+URL = '/webhooks/easypost/'
+
+
+@override_settings(EASYPOST_WEBHOOK_SECRET=SECRET)
+class EasyPostWebhookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='shop@example.com', email='shop@example.com')
+        booking = sample_bookings(user, 1, start_pk=None)[0]
+        booking.easypost_shipment_id = 'shp_webhook'
+        booking.tracking_code = 'EZ1000000001'
+        booking.current_status = ''
+        booking.current_status_at = None
+        booking.save()
+        cls.booking = booking
+
+    def post(self, payload, secret=SECRET):
+        body, headers = signed_webhook_request(payload, secret)
+        return self.client.post(URL, body, content_type='application/json', **headers)
+
+    def event(self, status, minutes_ago=0, **kwargs):
+        occurred_at = timezone.now() - timedelta(minutes=minutes_ago)
+        return tracker_event_payload('shp_webhook', status=status, occurred_at=occurred_at, **kwargs)
+
+    def test_valid_signature_is_accepted(self):
+        response = self.post(self.event('in_transit'))
+        self.assertEqual(response.status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.current_status, 'in_transit')
+        self.assertEqual(TrackingEvent.objects.filter(booking=self.booking).count(), 1)
+
+    def test_wrong_secret_is_rejected(self):
+        response = self.post(self.event('in_transit'), secret='not-the-secret')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(TrackingEvent.objects.exists())
+
+    def test_missing_signature_is_rejected(self):
+        response = self.client.post(URL, json.dumps(self.event('in_transit')), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_tampered_body_is_rejected(self):
+        body, headers = signed_webhook_request(self.event('in_transit'), SECRET)
+        tampered = body.replace(b'in_transit', b'delivered')
+        response = self.client.post(URL, tampered, content_type='application/json', **headers)
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(EASYPOST_WEBHOOK_SECRET='')
+    def test_rejected_when_no_secret_is_configured(self):
+        response = self.post(self.event('in_transit'), secret='')
+        self.assertEqual(response.status_code, 403)
+
+    def test_redelivered_event_is_stored_once(self):
+        event = self.event('in_transit')
+        self.assertEqual(self.post(event).status_code, 200)
+        self.assertEqual(self.post(event).status_code, 200)
+        self.assertEqual(TrackingEvent.objects.filter(event_id=event['id']).count(), 1)
+
+    def test_duplicate_in_one_batch_is_stored_once(self):
+        event = self.event('in_transit')
+        self.assertEqual(self.post([event, event]).status_code, 200)
+        self.assertEqual(TrackingEvent.objects.count(), 1)
+
+    def test_older_event_does_not_replace_newer_status(self):
+        self.post(self.event('out_for_delivery', minutes_ago=5))
+        self.post(self.event('in_transit', minutes_ago=60))
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.current_status, 'out_for_delivery')
+        # The late event is still kept in the history
+        self.assertEqual(TrackingEvent.objects.filter(booking=self.booking).count(), 2)
+
+    def test_newest_event_in_a_batch_wins(self):
+        self.post([
+            self.event('delivered', minutes_ago=1),
+            self.event('pre_transit', minutes_ago=120),
+            self.event('in_transit', minutes_ago=60),
+        ])
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.current_status, 'delivered')
+
+    def test_status_update_bumps_booking_version(self):
+        version = self.booking.version
+        self.post(self.event('in_transit'))
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.version, version + 1)
+
+    def test_unknown_shipment_is_ignored(self):
+        response = self.post(tracker_event_payload('shp_unknown', status='in_transit'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(TrackingEvent.objects.exists())
+
+    def test_non_object_items_are_rejected(self):
+        response = self.post([self.event('in_transit'), 'not-an-event'])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TrackingEvent.objects.exists())
+
+    def test_malformed_tracker_is_skipped(self):
+        broken = self.event('in_transit')
+        broken['result']['tracking_details'] = ['not-a-detail']
+        broken['result']['updated_at'] = 'yesterday'
+        not_a_tracker = self.event('in_transit')
+        not_a_tracker['result'] = ['not', 'a', 'tracker']
+        response = self.post([broken, not_a_tracker, self.event('delivered')])
+        self.assertEqual(response.status_code, 200)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.current_status, 'delivered')
+
+    def test_invalid_json_is_rejected(self):
+        body = b'{not json'
+        response = self.client.post(URL, body, content_type='application/json',
+                                    HTTP_X_HMAC_SIGNATURE=sign(body, SECRET))
+        self.assertEqual(response.status_code, 400)
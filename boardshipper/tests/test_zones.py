@@ -0,0 +1,14 @@
+from django.test import SimpleTestCase
+
+from boardshipper import zones
+
+
+class Zip3Tests(SimpleTestCase):
+    def test_prefix_of_a_us_zip(self):
+        self.assertEqual(zones.zip3(' 92648-1234'), '926')
+
+    def test_non_ascii_digits_are_not_a_prefix(self):
+        for value in ('²³¹45', '٩٢٦٤٨', '９２６４８', '92', 'SW1A 1AA', None):
+            with self.subTest(value=value):
+                self.assertEqual(zones.zip3(value), '')
+                self.assertEqual(zones.state_for_zip(value), '')
@@ -0,0 +1,150 @@
+# Seeding, a fake EasyPost, query-count budgets and EXPLAIN checks for the tests
+
+import re
+import shutil
+import tempfile
+import uuid
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import override_settings
+
+from boardshipper import api_log, utils
+from boardshipper.benchmarks import sample_bookings
+from boardshipper.fake_easypost import FakeEasyPost
+from boardshipper.models import Booking, UserProfile
+
+# Tables big enough that a full scan of them is a bug
+LARGE_TABLES = (
+    'boardshipper_booking',
+    'boardshipper_labelpurchasejob',
+    'boardshipper_trackingevent',
+    'boardshipper_apicalllog',
+    'boardshipper_savedrecipient',
+)
+
+
+def seed_shop(bookings=0):
+    """
+    A shop owner with a profile and ``bookings`` sample bookings, plus a superuser.
+
+    Emails are random, so seeding never collides with users already in the database.
+    """
+    suffix = uuid.uuid4().hex[:8]
+    email = f'shop-{suffix}@example.com'
+    user = User.objects.create_user(username=email, email=email)
+    UserProfile.objects.create(user=user, business_name='Test Surf Co', street_address='1 Surf Ave',
+                               city='San Clemente', state='CA', zip_code='92672', country='United States')
+    if bookings:
+        Booking.objects.bulk_create(sample_bookings(user, bookings, start_pk=None), batch_size=1000)
+    staff_email = f'admin-{suffix}@example.com'
+    staff = User.objects.create_superuser(username=staff_email, email=staff_email, password=None)
+    return user, staff
+
+
+class QueryRecorder:
+    """execute_wrapper that keeps the alias, SQL and parameters of every query"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((context['connection'].alias, sql, params))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def aliases(self, table_prefix='boardshipper_'):
+        """Aliases that ran a query mentioning one of our tables"""
+        return {alias for alias, sql, _ in self.queries if table_prefix in sql}
+
+
+@contextmanager
+def record_queries():
+    """Record every query run on any connection inside the block"""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def full_scans(connection, sql, params):
+    """Tables from LARGE_TABLES that the database would read in full for this query"""
+    vendor = connection.vendor
+    with connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            # "SCAN boardshipper_booking" without "USING ... INDEX" reads the whole table
+            details = [row[-1] for row in cursor.fetchall()]
+            return [
+                table for detail in details
+                for table in LARGE_TABLES
+                if re.match(rf'SCAN {table}( AS \w+)?$', detail)
+            ]
+        if vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [col[0] for col in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return [row['table'] for row in rows if row['type'] == 'ALL' and row['table'] in LARGE_TABLES]
+        if vendor == 'postgresql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            return [table for table in LARGE_TABLES if f'Seq Scan on {table}' in plan]
+    return []
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for checking a block's queries.
+
+        with self.assertQueryBudget(3):
+            self.client.get('/shipments/')
+
+    Fails if more than ``max_queries`` ran (unlike assertNumQueries, fewer is
+    fine), or if the EXPLAIN plan of any SELECT reads one of LARGE_TABLES in full.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries):
+        with record_queries() as recorder:
+            yield recorder
+        problems = []
+        if len(recorder) > max_queries:
+            problems.append(f'{len(recorder)} queries (budget {max_queries})')
+        for alias, sql, params in recorder.queries:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            for table in full_scans(connections[alias], sql, params):
+                problems.append(f'full scan of {table}: {sql[:200]}')
+        if problems:
+            self.fail('\n'.join(problems + [sql for _, sql, _ in recorder.queries]))
+
+
+class FakeEasyPostMixin:
+    """
+    TestCase mixin that points the EasyPost client at a FakeEasyPost
+    (self.easypost) for each test. ``fake_easypost_options`` are passed to it.
+    Labels bought from it are stored in a temporary directory.
+    """
+    fake_easypost_options = {}
+
+    def setUp(self):
+        super().setUp()
+        self.easypost = FakeEasyPost(**self.fake_easypost_options)
+        api_base = self.easypost.serve()
+        self.addCleanup(self.easypost.shutdown)
+        # Write the calls' ApiCallLog rows inside this test's transaction, not during a later test
+        self.addCleanup(api_log.flush)
+        self.enterContext(override_settings(EASYPOST_API_BASE=api_base, EASYPOST_BACKOFF_FACTOR=0))
+        self.enterContext(mock.patch.object(utils, 'EASYPOST_API_KEY', 'EZTKtest'))
+        label_dir = tempfile.mkdtemp(prefix='labels-')
+        self.addCleanup(shutil.rmtree, label_dir, ignore_errors=True)
+        self.enterContext(override_settings(STORAGES={
+            **settings.STORAGES,
+            'labels': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': label_dir}},
+        }))
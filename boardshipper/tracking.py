@@ -0,0 +1,136 @@
+# EasyPost tracker webhook ingestion
+
+import hashlib
+import hmac
+import unicodedata
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching
+from .models import Booking, TrackingEvent
+
+# Tracker statuses that will never change again
+TERMINAL_STATUSES = ('delivered', 'return_to_sender', 'failure', 'cancelled', 'error')
+
+SIGNATURE_HEADER = 'HTTP_X_HMAC_SIGNATURE'
+SIGNATURE_PREFIX = 'hmac-sha256-hex='
+
+
+def sign(body, secret):
+    """EasyPost webhook signature for a raw request body"""
+    key = unicodedata.normalize('NFKD', secret).encode('utf-8')
+    return SIGNATURE_PREFIX + hmac.new(key, body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body, signature, secret):
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign(body, secret), signature)
+
+
+def tracker_status(tracker):
+    """(status, occurred_at) from an EasyPost Tracker object; occurred_at is always aware"""
+    details = tracker.get('tracking_details') or []
+    latest = details[-1] if details and isinstance(details[-1], dict) else {}
+    occurred = latest.get('datetime') or tracker.get('updated_at')
+    occurred_at = parse_datetime(occurred) if occurred else None
+    if occurred_at is not None and timezone.is_naive(occurred_at):
+        # EasyPost timestamps without an offset are UTC
+        occurred_at = timezone.make_aware(occurred_at, dt_timezone.utc)
+    return tracker.get('status') or 'unknown', occurred_at
+
+
+def _parse_event(event):
+    """Pull the fields we store out of a tracker event, or None if it isn't one"""
+    result = event.get('result') or {}
+    if not event.get('id') or not isinstance(result, dict) or result.get('object') != 'Tracker':
+        return None
+    details = result.get('tracking_details') or []
+    if not isinstance(details, list):
+        return None
+    latest = details[-1] if details and isinstance(details[-1], dict) else {}
+    try:
+        status, occurred_at = tracker_status(result)
+    except (TypeError, ValueError):
+        # A timestamp that isn't a valid ISO 8601 string
+        return None
+    return {
+        'event_id': str(event['id'])[:100],
+        'tracker_id': str(result.get('id') or '')[:100],
+        'shipment_id': str(result.get('shipment_id') or ''),
+        'tracking_code': str(result.get('tracking_code') or ''),
+        'status': str(status)[:30],
+        'message': str(latest.get('message') or '')[:255],
+        'occurred_at': occurred_at,
+    }
+
+
+def ingest_events(events):
+    """
+    Store tracker events and update each booking's current_status.
+
+    Events already stored (same EasyPost event id) are skipped, so redelivered
+    webhooks are harmless. Returns the number of new events stored.
+    """
+    parsed = [p for p in (_parse_event(event) for event in events) if p]
+    if not parsed:
+        return 0
+
+    shipment_ids = {p['shipment_id'] for p in parsed if p['shipment_id']}
+    codes = {p['tracking_code'] for p in parsed if p['tracking_code']}
+    bookings = Booking.objects.filter(
+        Q(easypost_shipment_id__in=shipment_ids) | Q(tracking_code__in=codes)
+    ).values_list('pk', 'easypost_shipment_id', 'tracking_code')
+    by_shipment = {}
+    by_code = {}
+    for pk, shipment_id, code in bookings:
+        if shipment_id:
+            by_shipment[shipment_id] = pk
+        if code:
+            by_code[code] = pk
+
+    seen = set(
+        TrackingEvent.objects
+        .filter(event_id__in=[p['event_id'] for p in parsed])
+        .values_list('event_id', flat=True)
+    )
+    new_events = []
+    latest = {}
+    for p in parsed:
+        booking_id = by_shipment.get(p['shipment_id']) or by_code.get(p['tracking_code'])
+        if booking_id is None or p['event_id'] in seen:
+            continue
+        seen.add(p['event_id'])
+        new_events.append(TrackingEvent(
+            booking_id=booking_id,
+            event_id=p['event_id'],
+            tracker_id=p['tracker_id'],
+            status=p['status'],
+            message=p['message'],
+            occurred_at=p['occurred_at'],
+        ))
+        current = latest.get(booking_id)
+        if current is None or (p['occurred_at'] and (current['occurred_at'] is None or p['occurred_at'] >= current['occurred_at'])):
+            latest[booking_id] = p
+
+    with transaction.atomic():
+        # ignore_conflicts covers a concurrent delivery of the same event
+        TrackingEvent.objects.bulk_create(new_events, ignore_conflicts=True)
+        for booking_id, p in latest.items():
+            update_status(booking_id, p['status'], p['occurred_at'])
+    return len(new_events)
+
+
+def update_status(booking_id, status, occurred_at):
+    """Set a booking's current_status unless it already has a newer one"""
+    occurred_at = occurred_at or timezone.now()
+    updated = Booking.objects.filter(pk=booking_id).filter(
+        Q(current_status_at__isnull=True) | Q(current_status_at__lte=occurred_at)
+    ).update(current_status=status, current_status_at=occurred_at, version=F('version') + 1)
+    if updated:
+        caching.bookings_changed(Booking.objects.filter(pk=booking_id).values_list('user_id', flat=True))
+    return updated
@@ -6,8 +6,17 @@ urlpatterns = [
     path('about/', views.about, name='about'),
     path('contact/', views.contact, name='contact'),
     path('book/', views.book, name='book'),
+    path('quote/', views.quote, name='quote'),
+    path('recipients/autocomplete/', views.recipient_autocomplete, name='recipient_autocomplete'),
+    path('book/import/', views.import_bookings_view, name='import_bookings'),
     path('booking/<int:pk>/', views.booking_detail, name='booking_detail'),
+    path('booking/<int:pk>/status/', views.booking_status, name='booking_status'),
+    path('booking/<int:pk>/label/', views.booking_label, name='booking_label'),
     path('shipments/', views.shipments, name='shipments'),
+    path('shipments/labels/', views.download_labels, name='download_labels'),
+    path('shipments/export/', views.export_shipments, name='export_shipments'),
+    path('webhooks/easypost/', views.easypost_webhook, name='easypost_webhook'),
+    path('metrics', views.metrics_view, name='metrics'),
     path('login/', views.login_view, name='login'),
     path('register/', views.register_view, name='register'),
     path('logout/', views.logout_view, name='logout'),
@@ -1,9 +1,17 @@
 # Utility functions and constants for BoardShipper
 
+import json
+import math
 import os
+import time
+from concurrent import futures
 import requests
-import base64
 from dotenv import load_dotenv
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from . import api_log, easypost_client, rate_cache, rate_selection, recipients
+from .models import SavedRecipient
 
 # Load environment variables from .env file
 load_dotenv()
@@ -57,49 +65,81 @@ BOX_SIZE_MAP = {
     'longboard':  {'length': 120, 'width': 24, 'height': 7},   # 120 × 24 × 7 in
 }
 
+def percentile(values, pct):
+    """Nearest-rank percentile (pct in 0-100) of a list of numbers, or None if it is empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
 # EasyPost API Key - loaded from .env file or environment variables
 EASYPOST_API_KEY = os.getenv('EASYPOST_API_KEY', '')
 
-def create_easypost_shipment(sender_profile, booking):
+class EasyPostError(Exception):
     """
-    Create a shipment with EasyPost and purchase a shipping label.
-    
-    Args:
-        sender_profile: UserProfile object with sender's address information
-        booking: Booking object with recipient info and package details
+    Raised when a shipment cannot be created or its label purchased.
     
-    Returns:
-        dict with shipment_id, label_url, and tracking_url
+    ``retryable`` is True only for failures that happened before a purchase was
+    attempted, so retrying can never buy a second label.
     """
-    if not EASYPOST_API_KEY:
-        raise ValueError("EASYPOST_API_KEY not configured. Please set it in environment variables.")
-    
-    is_test_mode = EASYPOST_API_KEY.startswith('EZTK')
-    
-    parcel_info = BOX_SIZE_MAP.get(booking.box_size, BOX_SIZE_MAP['shortboard'])
-    
-    recipient_country_code = COUNTRY_CODE_MAP.get(booking.recipient_country, 'US')
-    sender_country_code = COUNTRY_CODE_MAP.get(sender_profile.country, 'US')
-    to_address = {
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+def recipient_address(booking):
+    """The booking's recipient as an EasyPost address"""
+    return {
         "name": f"{booking.recipient_first_name} {booking.recipient_last_name}",
         "street1": booking.recipient_street,
         "city": booking.recipient_city,
         "state": booking.recipient_state,
         "zip": booking.recipient_zip,
-        "country": recipient_country_code,
+        "country": COUNTRY_CODE_MAP.get(booking.recipient_country, 'US'),
         "email": booking.recipient_email,
         "phone": booking.recipient_phone
     }
-    from_address = {
-        "name": sender_profile.business_name or "Sender Name",
-        "street1": sender_profile.street_address,
-        "city": sender_profile.city,
-        "state": sender_profile.state,
-        "zip": sender_profile.zip_code,
-        "country": sender_country_code,
-        "email": sender_profile.user.email or "sender@example.com",
-        "phone": "555-555-5555"
-    }
+
+# Built from_address dicts by (profile id, profile version, email); treat them as read-only
+_sender_addresses = {}
+SENDER_ADDRESS_CACHE_SIZE = 1000
+
+def sender_address(sender_profile):
+    """The profile's EasyPost from_address, built once per profile version"""
+    email = sender_profile.user.email
+    key = (sender_profile.pk, sender_profile.version, email)
+    address = _sender_addresses.get(key)
+    if address is None:
+        address = {
+            "name": sender_profile.business_name or "Sender Name",
+            "street1": sender_profile.street_address,
+            "city": sender_profile.city,
+            "state": sender_profile.state,
+            "zip": sender_profile.zip_code,
+            "country": COUNTRY_CODE_MAP.get(sender_profile.country, 'US'),
+            "email": email or "sender@example.com",
+            "phone": "555-555-5555"
+        }
+        if sender_profile.pk is not None:
+            if len(_sender_addresses) >= SENDER_ADDRESS_CACHE_SIZE:
+                _sender_addresses.clear()
+            _sender_addresses[key] = address
+    return address
+
+def build_shipment_payload(sender_profile, booking, weight=None, to_address_id=None):
+    """
+    Build the EasyPost shipment request for a booking.
+    
+    Args:
+        sender_profile: UserProfile object with sender's address information
+        booking: Booking object with recipient info and package details
+        weight: optional weight in pounds to use instead of booking.weight
+        to_address_id: id of an already verified EasyPost address to ship to
+    """
+    parcel_info = BOX_SIZE_MAP.get(booking.box_size, BOX_SIZE_MAP['shortboard'])
+    
+    to_address = {"id": to_address_id} if to_address_id else recipient_address(booking)
+    from_address = sender_address(sender_profile)
     
     payload = {
         "shipment": {
@@ -109,7 +149,7 @@ def create_easypost_shipment(sender_profile, booking):
                 "length": float(parcel_info['length']),
                 "width": float(parcel_info['width']),
                 "height": float(parcel_info['height']),
-                "weight": float(booking.weight) * 16,  # Convert pounds to ounces
+                "weight": float(weight if weight is not None else booking.weight) * 16,  # Convert pounds to ounces
             }
         }
     }
@@ -117,55 +157,237 @@ def create_easypost_shipment(sender_profile, booking):
     if booking.order_reference:
         payload["shipment"]["reference"] = booking.order_reference
     
-    # Prepare authentication headers
-    headers = {
-        'Authorization': 'Basic ' + base64.b64encode(f"{EASYPOST_API_KEY}:".encode()).decode(),
-        'Content-Type': 'application/json'
-    }
-    
-    # Create shipment with EasyPost
+    return payload
+
+def _create_shipment(payload, booking=None, deadline=None):
+    """POST a shipment to EasyPost and return it, raising EasyPostError if it has no rates"""
+    # Creating a shipment buys nothing, so it is safe to retry.
+    started = time.perf_counter()
+    resp = None
     try:
-        resp = requests.post(
-            'https://api.easypost.com/v2/shipments',
+        resp = easypost_client.post(
+            EASYPOST_API_KEY,
+            '/v2/shipments',
             json=payload,
-            headers=headers
+            idempotent=True,
+            deadline=deadline
         )
         resp.raise_for_status()
     except requests.exceptions.RequestException as e:
-        raise Exception(f"EasyPost API Error creating shipment: {str(e)}")
+        retryable = e.response is None or e.response.status_code >= 500 or e.response.status_code == 429
+        raise EasyPostError(f"EasyPost API Error creating shipment: {str(e)}", retryable=retryable)
+    finally:
+        api_log.record('create_shipment', booking, resp, started,
+                       request_bytes=len(json.dumps(payload)))
     
     if resp.status_code != 200 and resp.status_code != 201:
-        raise Exception(f"EasyPost Error: {resp.text}")
+        raise EasyPostError(f"EasyPost Error: {resp.text}")
     
     shipment = resp.json()
     
     if not shipment.get('rates'):
-        if is_test_mode:
-            raise Exception("No shipping rates available. Test mode is using fixed test addresses.")
+        if EASYPOST_API_KEY.startswith('EZTK'):
+            raise EasyPostError("No shipping rates available. Test mode is using fixed test addresses.")
         else:
-            raise Exception("No shipping rates available for this shipment. Please verify the addresses are valid.")
+            raise EasyPostError("No shipping rates available for this shipment. Please verify the addresses are valid.")
+    
+    return shipment
+
+def verified_address_id(booking):
+    """
+    EasyPost address id for the booking's recipient, verifying the address once per shop.
+    
+    Addresses already verified for this user are reused without another
+    round trip as long as every recipient detail is unchanged; otherwise the
+    current details are verified as a new EasyPost address. Addresses that
+    recently failed verification raise
+    EasyPostError right away instead of surfacing later as a failed rate
+    lookup. If EasyPost can't be reached, returns None and the address is sent
+    inline unverified.
+    """
+    saved = recipients.known_address(booking)
+    if (saved and saved.verification == SavedRecipient.VERIFICATION_VERIFIED and saved.easypost_address_id
+            and recipients.matches_booking(saved, booking)):
+        recipients.remember(booking)
+        return saved.easypost_address_id
+    if saved and recipients.failed_recently(saved):
+        raise EasyPostError(f"Recipient address could not be verified: {saved.verification_message}")
+    
+    payload = {'address': recipient_address(booking), 'verify': ['delivery']}
+    started = time.perf_counter()
+    resp = None
+    try:
+        # Creating an address has no side effects, so it is safe to retry
+        resp = easypost_client.post(EASYPOST_API_KEY, '/v2/addresses', json=payload, idempotent=True)
+        resp.raise_for_status()
+        address = resp.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+    finally:
+        api_log.record('verify_address', booking, resp, started, request_bytes=len(json.dumps(payload)))
+    
+    delivery = (address.get('verifications') or {}).get('delivery') or {}
+    if delivery.get('success'):
+        recipients.remember(
+            booking,
+            verification=SavedRecipient.VERIFICATION_VERIFIED,
+            verification_message='',
+            easypost_address_id=address.get('id') or '',
+            verified_at=timezone.now(),
+        )
+        return address.get('id') or None
+    
+    message = '; '.join(e.get('message', '') for e in delivery.get('errors') or []) or 'Address not found'
+    recipients.remember(
+        booking,
+        verification=SavedRecipient.VERIFICATION_FAILED,
+        verification_message=message[:255],
+        easypost_address_id='',
+        verified_at=timezone.now(),
+    )
+    raise EasyPostError(f"Recipient address could not be verified: {message}")
+
+def _rate_key(sender_profile, booking):
+    return rate_cache.rate_cache_key(sender_profile.zip_code, booking.recipient_zip, booking.box_size, booking.weight)
+
+def _create_shipment_in_thread(payload, booking, deadline):
+    try:
+        return _create_shipment(payload, booking, deadline=deadline)
+    finally:
+        # Logging the call may have opened a connection in this pool thread
+        connections.close_all()
+
+def _shop_rates(payload, booking, policy):
+    """
+    Fetch rates for a shipment payload from every carrier account the policy allows.
+    
+    With EASYPOST_CARRIER_ACCOUNTS configured, one shipment is created per
+    account, all at once, and whatever has arrived after RATE_SHOPPING_DEADLINE
+    seconds is used; slower accounts are left out. Each call gets its own
+    thread and HTTP timeouts capped at the deadline, so a slow carrier can't
+    hold threads that later bookings are waiting for. Each rate keeps the id
+    of the shipment it belongs to, which is the one to buy it on.
+    
+    Returns:
+        (rates, partial, complete): partial is True if an account missed the
+        deadline or failed; complete is True only if every configured account
+        was asked and answered, i.e. the rates can be cached for the lane
+    """
+    accounts = rate_selection.carrier_accounts(policy)
+    if not accounts:
+        shipment = _create_shipment(payload, booking)
+        for rate in shipment['rates']:
+            rate.setdefault('shipment_id', shipment['id'])
+        return shipment['rates'], False, True
+    
+    deadline = time.monotonic() + settings.RATE_SHOPPING_DEADLINE
+    pool = futures.ThreadPoolExecutor(max_workers=len(accounts), thread_name_prefix='rate-shopping')
+    pending = []
+    for account_id in accounts:
+        account_payload = dict(payload, shipment=dict(payload['shipment'], carrier_accounts=[account_id]))
+        pending.append(pool.submit(_create_shipment_in_thread, account_payload, booking, deadline))
+    done, late = futures.wait(pending, timeout=max(0, deadline - time.monotonic()))
+    # Stragglers give up on their own once their capped timeouts run out
+    pool.shutdown(wait=False)
+    
+    rates, errors = [], []
+    for future in done:
+        try:
+            shipment = future.result()
+        except EasyPostError as e:
+            errors.append(e)
+            continue
+        for rate in shipment['rates']:
+            rate.setdefault('shipment_id', shipment['id'])
+            rates.append(rate)
+    
+    if not rates:
+        if late or any(e.retryable for e in errors):
+            raise EasyPostError(
+                f"No carrier account returned rates within {settings.RATE_SHOPPING_DEADLINE:g}s",
+                retryable=True,
+            )
+        raise errors[0]
+    partial = bool(late or errors)
+    return rates, partial, not partial and len(accounts) == len(settings.EASYPOST_CARRIER_ACCOUNTS)
+
+def quote_shipping_rates(sender_profile, booking):
+    """
+    Return the rates the shop would choose from for a booking's lane, without buying a label.
+    
+    Rates are served from the shared rate cache when possible; on a miss a
+    shipment is created (but not bought) per carrier account to fetch them.
+    
+    Returns:
+        list of dicts with carrier, service, rate and delivery_days, in the
+        order of the shop's rate policy (best first)
+    """
+    if not EASYPOST_API_KEY:
+        raise ValueError("EASYPOST_API_KEY not configured. Please set it in environment variables.")
+    
+    policy = rate_selection.policy_for(sender_profile)
+    key = _rate_key(sender_profile, booking)
+    rates = rate_cache.get_rates(key)
+    if rates is None:
+        payload = build_shipment_payload(sender_profile, booking, weight=rate_cache.weight_bucket(booking.weight))
+        rates, _, complete = _shop_rates(payload, None, policy)
+        if complete:
+            rates = rate_cache.store_rates(key, rates)
+    return rate_selection.select_rates(rates, policy)
+
+def create_easypost_shipment(sender_profile, booking):
+    """
+    Create a shipment with EasyPost and purchase a shipping label.
+    
+    Args:
+        sender_profile: UserProfile object with sender's address information
+        booking: Booking object with recipient info and package details
+    
+    Returns:
+        dict with shipment_id, label_url, and tracking_url
+    """
+    if not EASYPOST_API_KEY:
+        raise ValueError("EASYPOST_API_KEY not configured. Please set it in environment variables.")
+    
+    # Lanes known to have no rate the shop's policy accepts fail fast without a round trip
+    policy = rate_selection.policy_for(sender_profile)
+    key = _rate_key(sender_profile, booking)
+    # Rates are fetched below either way, so this lookup isn't a cache hit or miss
+    cached = rate_cache.get_rates(key, count=False)
+    if cached is not None and not rate_selection.select_rates(cached, policy):
+        raise EasyPostError("No shipping rate available for this location. Contact admin.")
     
-    rates = shipment.get('rates', [])
-    gso_rates = [rate for rate in rates if rate.get('carrier') == 'GSO']
+    to_address_id = verified_address_id(booking)
+    payload = build_shipment_payload(sender_profile, booking, to_address_id=to_address_id)
+    rates, partial, complete = _shop_rates(payload, booking, policy)
+    if complete:
+        rate_cache.store_rates(key, rates)
     
-    if not gso_rates:
-        raise Exception("No shipping rate available for this location. Contact admin.")
+    acceptable = rate_selection.select_rates(rates, policy)
+    if not acceptable:
+        # A carrier that missed the deadline might still have had a rate
+        raise EasyPostError("No shipping rate available for this location. Contact admin.", retryable=partial)
     
-    cheapest_rate = min(gso_rates, key=lambda x: float(x.get('rate', float('inf'))))
-    rate_id = cheapest_rate['id']
+    best_rate = acceptable[0]
+    rate_id = best_rate['id']
     
+    buy_payload = {'rate': {'id': rate_id}, 'insurance': '300.00'}
+    started = time.perf_counter()
+    buy_resp = None
     try:
-        buy_resp = requests.post(
-            f"https://api.easypost.com/v2/shipments/{shipment['id']}/buy",
-            json={'rate': {'id': rate_id}, 'insurance': '300.00'},
-            headers=headers
+        buy_resp = easypost_client.post(
+            EASYPOST_API_KEY,
+            f"/v2/shipments/{best_rate['shipment_id']}/buy",
+            json=buy_payload
         )
         buy_resp.raise_for_status()
     except requests.exceptions.RequestException as e:
-        raise Exception(f"EasyPost API Error purchasing label: {str(e)}")
+        raise EasyPostError(f"EasyPost API Error purchasing label: {str(e)}")
+    finally:
+        api_log.record('buy', booking, buy_resp, started, request_bytes=len(json.dumps(buy_payload)))
     
     if buy_resp.status_code != 200 and buy_resp.status_code != 201:
-        raise Exception(f"EasyPost Buy Error: {buy_resp.text}")
+        raise EasyPostError(f"EasyPost Buy Error: {buy_resp.text}")
     
     bought_shipment = buy_resp.json()
     
@@ -1,18 +1,40 @@
+import hmac
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from .models import Booking
-from .forms import BookingForm
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
+from .models import Booking, LabelPurchaseJob
+from .forms import BookingForm, ExportForm, QuoteForm
 from .auth_forms import LoginForm, RegistrationForm
-from .utils import create_easypost_shipment
+from .jobs import enqueue_label_purchase
+from .imports import CSV_FIELDS, CSVFileError, import_bookings, queue_labels
+from .utils import EasyPostError, quote_shipping_rates
+from . import caching, exports, labels, metrics, recipients, tracking
+from .caching import anonymous_page_cache
+from .routers import read_from_replica
 
+@anonymous_page_cache
 def home(request):
     return render(request, 'home.html')
 
+@anonymous_page_cache
 def about(request):
     return render(request, 'about.html')
 
+@anonymous_page_cache
 def contact(request):
     return render(request, 'contact.html')
 
@@ -73,50 +95,267 @@ def book(request):
             booking.user = request.user
             booking.service = 'door-to-door'
 
-            if hasattr(request.user, 'profile'):
-                booking.sender_name = request.user.profile.business_name
+            if request.profile:
+                booking.sender_name = request.profile.business_name
             else:
                 booking.sender_name = request.user.first_name
             
-            # Try to create the shipment with EasyPost first
-            try:
-                if hasattr(request.user, 'profile'):
-                    sender_profile = request.user.profile
-                    result = create_easypost_shipment(sender_profile, booking)
-                    booking.label_url = result['label_url']
-                    booking.tracking_url = result['tracking_url']
-                    booking.easypost_shipment_id = result['shipment_id']
-                    booking.shipping_carrier = result.get('carrier', '')
-                    booking.shipping_service = result.get('service', '')
-                    # Store both the actual EasyPost rate and customer price
-                    booking.shipping_rate = result.get('rate', 0)  # Actual EasyPost rate
-                    booking.shipping_rate_user = booking.get_customer_price()  # Customer-facing price
-                    # Only save if EasyPost succeeds
-                    booking.save()
-                    return redirect('booking_detail', pk=booking.pk)
-            except Exception as e:
-                # If EasyPost fails, don't save the booking and show error
-                error_message = str(e)
-                form.add_error(None, 
-                    f'Unable to process shipment: {error_message}. '
-                    'Please verify the address details and try again. If the problem persists, '
-                    'please contact support.')
-                # Don't save the booking if EasyPost fails
+            # Save the booking as pending and let the label worker buy the label
+            if request.profile:
+                # A repeated submission (double click, retried POST) replays the first one
+                original = _booking_for_key(request.user, booking.idempotency_key)
+                if original is not None:
+                    return redirect('booking_detail', pk=original.pk)
+                booking.status = Booking.STATUS_PENDING
+                try:
+                    with transaction.atomic():
+                        booking.save()
+                        enqueue_label_purchase(booking)
+                except IntegrityError:
+                    # A concurrent duplicate got there first; its job is the only purchase
+                    original = _booking_for_key(request.user, booking.idempotency_key)
+                    if original is None:
+                        raise
+                    return redirect('booking_detail', pk=original.pk)
+                return redirect('booking_detail', pk=booking.pk)
         # Form errors are displayed in template
     else:
-        form = BookingForm()
+        form = BookingForm(initial={'idempotency_key': BookingForm.new_idempotency_key()})
     
     return render(request, 'book.html', {'form': form, 'show_welcome': show_welcome})
 
+def _booking_for_key(user, idempotency_key):
+    if not idempotency_key:
+        return None
+    return Booking.objects.filter(user=user, idempotency_key=idempotency_key).only('pk').first()
+
+@login_required
+def quote(request):
+    form = QuoteForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    if not request.profile:
+        return JsonResponse({'error': 'Please complete your business profile first.'}, status=400)
+    booking = Booking(recipient_country='United States', **form.cleaned_data)
+    price = booking.get_customer_price()
+    if price is None:
+        # Not a lane we ship to, so there is nothing to ask EasyPost about
+        return JsonResponse({'available': False, 'price': None, 'delivery_days': None})
+    try:
+        rates = quote_shipping_rates(request.profile, booking)
+    except EasyPostError as e:
+        return JsonResponse({'error': str(e)}, status=502)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    delivery_days = [rate['delivery_days'] for rate in rates if rate.get('delivery_days')]
+    return JsonResponse({
+        'available': bool(rates),
+        'price': price if rates else None,
+        'delivery_days': min(delivery_days) if delivery_days else None,
+    })
+
 @login_required
+def recipient_autocomplete(request):
+    results = list(recipients.autocomplete(request.user, request.GET.get('q', '')))
+    return JsonResponse({'results': results})
+
+@login_required
+def import_bookings_view(request):
+    results = None
+    error = ''
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            error = 'Please choose a CSV file to upload.'
+        elif not request.profile:
+            error = 'Please complete your business profile before importing bookings.'
+        else:
+            try:
+                results, bookings = import_bookings(request.user, upload.file)
+            except CSVFileError as e:
+                error = str(e)
+                results, bookings = e.results or None, e.bookings
+            # Labels are bought by the label worker pool, so the upload returns right away
+            queue_labels(bookings)
+    return render(request, 'import.html', {
+        'results': results,
+        'error': error,
+        'columns': CSV_FIELDS,
+        'imported': sum(1 for r in results if r['status'] == 'ok') if results else 0,
+    })
+
+# The shipments and booking pages only show the user's own bookings, so their
+# ETag/Last-Modified come from the per-user change stamp without touching the
+# database, and an unchanged page is answered with 304 before the view runs.
+# no-cache makes browsers revalidate on every load; private keeps them out of shared caches.
+def _bookings_etag(request, *args, **kwargs):
+    return caching.user_etag(request, request.path, request.GET.get('before', ''))
+
+def _bookings_last_modified(request, *args, **kwargs):
+    return caching.changed_at(request.user.pk)
+
+bookings_conditional = condition(etag_func=_bookings_etag, last_modified_func=_bookings_last_modified)
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@bookings_conditional
+@read_from_replica
 def booking_detail(request, pk):
     booking = get_object_or_404(Booking, pk=pk, user=request.user)
-    return render(request, 'booking_detail.html', {'booking': booking})
+    error = ''
+    if booking.status == Booking.STATUS_FAILED:
+        error = _label_error(booking.pk)
+    return render(request, 'booking_detail.html', {'booking': booking, 'label_error': error})
+
+@login_required
+def booking_status(request, pk):
+    booking = (Booking.objects
+               .filter(pk=pk, user=request.user)
+               .values('status', 'label_url', 'tracking_url')
+               .first())
+    if booking is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    if booking['status'] == Booking.STATUS_FAILED:
+        booking['error'] = _label_error(pk)
+    return JsonResponse(booking)
+
+def _label_error(booking_id):
+    job = LabelPurchaseJob.objects.filter(booking_id=booking_id).order_by('-pk').only('last_error').first()
+    return job.last_error if job else ''
+
+# Shipments shown per page, and the only columns shipments.html needs
+SHIPMENTS_PAGE_SIZE = 50
+SHIPMENT_LIST_FIELDS = ['id', 'created_at', 'sender_name', 'recipient_first_name',
+                        'recipient_last_name', 'label_url', 'tracking_url', 'current_status', 'version']
+
+def _encode_cursor(booking):
+    return f"{int(booking.created_at.timestamp() * 1_000_000)}.{booking.pk}"
+
+def _decode_cursor(value):
+    try:
+        micros, pk = value.split('.')
+        created_at = datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc)
+        return created_at, int(pk)
+    except (ValueError, OverflowError, OSError):
+        return None
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@bookings_conditional
+@read_from_replica
 def shipments(request):
-    bookings = Booking.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'shipments.html', {'bookings': bookings})
+    cursor = _decode_cursor(request.GET.get('before', ''))
+    # The rendered list is cached until one of the user's bookings changes
+    key = caching.fragment_key('shipments', request.user.pk, caching.generation(request.user.pk),
+                               f'{cursor[0].timestamp()}.{cursor[1]}' if cursor else 'first')
+    listing = caching.get_fragment('shipments', key)
+    if listing is None:
+        listing = _shipments_listing(request, cursor)
+        caching.set_fragment(key, listing)
+    return render(request, 'shipments.html', {'listing': listing})
+
+def _shipments_listing(request, cursor):
+    # Keyset pagination on (created_at, id) so every page costs the same
+    bookings = Booking.objects.filter(user=request.user)
+    if cursor:
+        created_at, pk = cursor
+        bookings = bookings.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    page = list(
+        bookings.order_by('-created_at', '-pk')
+        .only(*SHIPMENT_LIST_FIELDS)[:SHIPMENTS_PAGE_SIZE + 1]
+    )
+    next_cursor = None
+    if len(page) > SHIPMENTS_PAGE_SIZE:
+        page = page[:SHIPMENTS_PAGE_SIZE]
+        next_cursor = _encode_cursor(page[-1])
+    return render_to_string('shipments_list.html', {
+        'bookings': page,
+        'label_ids': ','.join(str(booking.pk) for booking in page if booking.label_url),
+        'next_cursor': next_cursor,
+        'is_first_page': cursor is None,
+    }, request)
+
+@login_required
+@read_from_replica
+def export_shipments(request):
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    data = form.cleaned_data
+    # Staff can export everyone's shipments or pick a user; customers only get their own
+    if request.user.is_staff:
+        user = User.objects.filter(email=data['user']).first() if data['user'] else None
+        if data['user'] and user is None:
+            return JsonResponse({'error': 'Unknown user'}, status=404)
+    else:
+        user = request.user
+    fields = exports.fields_for(request.user)
+    rows = exports.export_queryset(start=data['start'], end=data['end'], user=user, fields=fields)
+    fmt = data['format'] or 'csv'
+    generate, content_type = exports.FORMATS[fmt]
+    response = StreamingHttpResponse(generate(rows, fields), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="shipments.{fmt}"'
+    return response
+
+def _label_bookings(request):
+    # Staff can fetch any booking's label; customers only their own
+    bookings = Booking.objects.exclude(label_url__isnull=True).exclude(label_url='')
+    if not request.user.is_staff:
+        bookings = bookings.filter(user=request.user)
+    return bookings.only('id', 'created_at', 'label_url', 'label_file', 'tracking_code')
+
+@login_required
+def booking_label(request, pk):
+    booking = get_object_or_404(_label_bookings(request), pk=pk)
+    source = labels.open_label(booking)
+    if source is None:
+        # No local copy; fall back to EasyPost's hosted file
+        return redirect(booking.label_url)
+    response = FileResponse(
+        source,
+        content_type=labels.content_type(booking.label_file.name),
+        filename=f'label-{booking.pk}{os.path.splitext(booking.label_file.name)[1]}',
+    )
+    patch_cache_control(response, private=True, max_age=settings.LABEL_CACHE_MAX_AGE)
+    return response
+
+@login_required
+def download_labels(request):
+    try:
+        ids = [int(value) for value in request.GET.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        return JsonResponse({'error': 'ids must be a comma-separated list of booking ids'}, status=400)
+    if not ids:
+        raise Http404
+    if len(ids) > settings.LABEL_ZIP_MAX:
+        return JsonResponse({'error': f'At most {settings.LABEL_ZIP_MAX} labels per download'}, status=400)
+    return labels.zip_response(_label_bookings(request).filter(pk__in=ids).order_by('pk'))
+
+@csrf_exempt
+@require_POST
+def easypost_webhook(request):
+    signature = request.META.get(tracking.SIGNATURE_HEADER, '')
+    if not tracking.verify_signature(request.body, signature, settings.EASYPOST_WEBHOOK_SECRET):
+        return HttpResponse(status=403)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return HttpResponse(status=400)
+    events = payload if isinstance(payload, list) else [payload]
+    if not all(isinstance(event, dict) for event in events):
+        return HttpResponse(status=400)
+    tracking.ingest_events(events)
+    return HttpResponse(status=200)
+
+def metrics_view(request):
+    # Scrapers authenticate with METRICS_TOKEN; staff can look in a browser
+    token = settings.METRICS_TOKEN
+    authorized = request.user.is_staff or (
+        token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    )
+    if not authorized:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 def custom_404(request, exception):
     return render(request, '404.html', status=404)
@@ -0,0 +1,154 @@
+# ZIP3 prefix index for classifying US destinations
+
+from array import array
+from pathlib import Path
+
+from django.db.models import CharField, Q, Value
+from django.db.models.functions import Replace, Substr, Trim, Upper
+from django.db.models.lookups import In, Range, Regex
+
+DATA_FILE = Path(__file__).resolve().parent / 'data' / 'zip3_states.txt'
+
+STATE_NAMES = {
+    'AL': 'ALABAMA', 'AK': 'ALASKA', 'AZ': 'ARIZONA', 'AR': 'ARKANSAS',
+    'CA': 'CALIFORNIA', 'CO': 'COLORADO', 'CT': 'CONNECTICUT', 'DE': 'DELAWARE',
+    'DC': 'DISTRICT OF COLUMBIA', 'FL': 'FLORIDA', 'GA': 'GEORGIA', 'HI': 'HAWAII',
+    'ID': 'IDAHO', 'IL': 'ILLINOIS', 'IN': 'INDIANA', 'IA': 'IOWA',
+    'KS': 'KANSAS', 'KY': 'KENTUCKY', 'LA': 'LOUISIANA', 'ME': 'MAINE',
+    'MD': 'MARYLAND', 'MA': 'MASSACHUSETTS', 'MI': 'MICHIGAN', 'MN': 'MINNESOTA',
+    'MS': 'MISSISSIPPI', 'MO': 'MISSOURI', 'MT': 'MONTANA', 'NE': 'NEBRASKA',
+    'NV': 'NEVADA', 'NH': 'NEW HAMPSHIRE', 'NJ': 'NEW JERSEY', 'NM': 'NEW MEXICO',
+    'NY': 'NEW YORK', 'NC': 'NORTH CAROLINA', 'ND': 'NORTH DAKOTA', 'OH': 'OHIO',
+    'OK': 'OKLAHOMA', 'OR': 'OREGON', 'PA': 'PENNSYLVANIA', 'RI': 'RHODE ISLAND',
+    'SC': 'SOUTH CAROLINA', 'SD': 'SOUTH DAKOTA', 'TN': 'TENNESSEE', 'TX': 'TEXAS',
+    'UT': 'UTAH', 'VT': 'VERMONT', 'VA': 'VIRGINIA', 'WA': 'WASHINGTON',
+    'WV': 'WEST VIRGINIA', 'WI': 'WISCONSIN', 'WY': 'WYOMING',
+    'PR': 'PUERTO RICO', 'VI': 'VIRGIN ISLANDS', 'GU': 'GUAM',
+}
+
+# Common abbreviations people type instead of the postal code (after dots are removed)
+STATE_ALIASES = {
+    'CALIF': 'CA', 'CAL': 'CA', 'ORE': 'OR', 'OREG': 'OR', 'WASH': 'WA',
+    'COLO': 'CO', 'ARIZ': 'AZ', 'IDA': 'ID', 'TEX': 'TX', 'NEV': 'NV',
+}
+
+# Index 0 means "unknown"; codes are stored as 1-based indexes into this tuple
+STATE_CODES = ('',) + tuple(sorted(STATE_NAMES))
+_CODE_INDEX = {code: i for i, code in enumerate(STATE_CODES)}
+
+_SPELLINGS = {}
+for _code, _name in STATE_NAMES.items():
+    _SPELLINGS[_code] = _code
+    _SPELLINGS[_name] = _code
+for _alias, _code in STATE_ALIASES.items():
+    _SPELLINGS[_alias] = _code
+
+_index = None
+_ranges = None
+
+
+def _load():
+    global _index, _ranges
+    index = array('B', bytes(1000))
+    ranges = []
+    with open(DATA_FILE) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            span, code = line.split()
+            first, last = (int(part) for part in span.split('-'))
+            for prefix in range(first, last + 1):
+                index[prefix] = _CODE_INDEX[code]
+            ranges.append((first, last, code))
+    _ranges = ranges
+    _index = index
+
+
+def _get_index():
+    if _index is None:
+        _load()
+    return _index
+
+
+def zip3(value):
+    """The 3-digit ZIP prefix of a postal code, or '' if it doesn't start with three digits"""
+    prefix = (value or '').strip()[:3]
+    return prefix if len(prefix) == 3 and prefix.isascii() and prefix.isdigit() else ''
+
+
+def normalize_state(value):
+    """Map free-text state input ("ca", "Calif.", "California") to a postal code, or ''"""
+    key = (value or '').strip().upper().replace('.', '')
+    return _SPELLINGS.get(key, '')
+
+
+def state_for_zip(value):
+    """Postal state code for a ZIP code, or '' if the prefix is unknown"""
+    prefix = zip3(value)
+    if not prefix:
+        return ''
+    return STATE_CODES[_get_index()[int(prefix)]]
+
+
+def states_for_zips(values):
+    """Bulk version of state_for_zip for imports and reports"""
+    index = _get_index()
+    result = []
+    for value in values:
+        prefix = zip3(value)
+        result.append(STATE_CODES[index[int(prefix)]] if prefix else '')
+    return result
+
+
+def resolve_state(zip_code, state):
+    """State code for a destination: the ZIP prefix wins, the typed state is the fallback"""
+    return state_for_zip(zip_code) or normalize_state(state)
+
+
+# Database-side equivalents, for pricing many bookings in one query
+
+def spellings_for(codes):
+    """Every normalized spelling of the given state codes"""
+    codes = set(codes)
+    return sorted(spelling for spelling, code in _SPELLINGS.items() if code in codes)
+
+
+def zip_ranges_for(codes=None):
+    """(first, last) ZIP3 ranges for the given state codes, or for every known prefix"""
+    if _ranges is None:
+        _load()
+    merged = []
+    for first, last, code in _ranges:
+        if codes is not None and code not in codes:
+            continue
+        if merged and merged[-1][1] + 1 == first:
+            merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def zip3_expression(field):
+    return Substr(Trim(field), 1, 3, output_field=CharField())
+
+
+def normalized_state_expression(field):
+    return Replace(Upper(Trim(field)), Value('.'), Value(''), output_field=CharField())
+
+
+def zip_in_ranges_q(field, ranges):
+    """Q matching rows whose ZIP3 prefix falls in any of the ranges"""
+    prefix = zip3_expression(field)
+    condition = Q()
+    for first, last in ranges:
+        condition |= Q(Range(prefix, ('%03d' % first, '%03d' % last)))
+    return Q(Regex(Trim(field), r'^[0-9]{3}')) & condition
+
+
+def state_q(zip_field, state_field, codes):
+    """Q matching rows whose resolve_state() is one of the given codes"""
+    zip_known = zip_in_ranges_q(zip_field, zip_ranges_for())
+    by_zip = zip_in_ranges_q(zip_field, zip_ranges_for(codes))
+    by_state = Q(In(normalized_state_expression(state_field), spellings_for(codes)))
+    return by_zip | (~zip_known & by_state)
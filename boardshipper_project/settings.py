@@ -4,6 +4,7 @@ Django settings for boardshipper_project project.
 
 from pathlib import Path
 import os
+import sys
 
 # Load environment variables from .env file for local development
 if 'PYTHONANYWHERE_DOMAIN' not in os.environ:
@@ -28,6 +29,9 @@ if 'PYTHONANYWHERE_DOMAIN' not in os.environ:
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# True under manage.py test
+TESTING = sys.argv[1:2] == ['test']
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
@@ -60,16 +64,24 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    # Before staticfiles so boardshipper's collectstatic (which builds the
+    # image variants first) replaces the stock command
     'boardshipper',
+    'django.contrib.staticfiles',
 ]
 
 MIDDLEWARE = [
+    'boardshipper.middleware.MetricsMiddleware',
+    # Compresses responses. Pages with CSRF tokens stay safe from BREACH because
+    # Django masks the token differently on every response and pads the gzip
+    # header with random bytes ("Heal The Breach").
+    'django.middleware.gzip.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'boardshipper.middleware.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -124,6 +136,27 @@ else:
         }
     }
 
+# Optional read replica for the shipments, booking, admin list and export pages
+# (see boardshipper.routers). On PythonAnywhere set DB_REPLICA_HOST; locally
+# point DB_REPLICA_NAME at a second SQLite file.
+DATABASE_REPLICA_ALIAS = 'replica'
+if TESTING:
+    # A separate test database, so tests can check which alias each query used
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+    }
+elif os.environ.get('DB_REPLICA_HOST') and 'PYTHONANYWHERE_DOMAIN' in os.environ:
+    DATABASES['replica'] = {**DATABASES['default'], 'HOST': os.environ['DB_REPLICA_HOST']}
+elif os.environ.get('DB_REPLICA_NAME') and 'PYTHONANYWHERE_DOMAIN' not in os.environ:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['DB_REPLICA_NAME'],
+    }
+DATABASE_ROUTERS = ['boardshipper.routers.ReplicaRouter']
+# Seconds a user reads from the primary after their bookings change (read-your-writes)
+REPLICA_PIN_SECONDS = float(os.environ.get('REPLICA_PIN_SECONDS', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -165,12 +198,166 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic writes content-hashed copies of every static file, so the web
+# server can serve STATIC_ROOT with far-future caching (Cache-Control:
+# max-age=31536000, immutable); a changed file gets a new name.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'boardshipper.storage.StaticStorage',
+    },
+    # Local copies of shipping labels; see boardshipper.storage.label_storage
+    'labels': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': os.environ.get('LABEL_STORAGE_ROOT', os.path.join(BASE_DIR, 'private', 'labels')),
+        },
+    },
+}
+
+# Responsive image variants built by build_image_variants (and collectstatic)
+IMAGE_VARIANT_SOURCE_DIR = os.environ.get('IMAGE_VARIANT_SOURCE_DIR', os.path.join(BASE_DIR, 'static', 'images'))
+IMAGE_VARIANT_WIDTHS = [int(w) for w in os.environ.get('IMAGE_VARIANT_WIDTHS', '320,640,1024,1600').split(',')]
+
+# Uploaded files. Shipping labels are not kept here (see STORAGES['labels']).
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Users are loaded from the cache on each request (see boardshipper.backends).
+# ModelBackend stays listed because sessions store the path of the backend that
+# logged them in; without it every session from before the switch would be logged out.
+AUTHENTICATION_BACKENDS = [
+    'boardshipper.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Login URLs
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'book'
-LOGOUT_REDIRECT_URL = 'home'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'home'
+
+# EasyPost HTTP client
+EASYPOST_API_BASE = os.environ.get('EASYPOST_API_BASE', 'https://api.easypost.com')
+EASYPOST_CONNECT_TIMEOUT = float(os.environ.get('EASYPOST_CONNECT_TIMEOUT', '5'))
+EASYPOST_READ_TIMEOUT = float(os.environ.get('EASYPOST_READ_TIMEOUT', '30'))
+EASYPOST_MAX_RETRIES = int(os.environ.get('EASYPOST_MAX_RETRIES', '3'))
+EASYPOST_BACKOFF_FACTOR = float(os.environ.get('EASYPOST_BACKOFF_FACTOR', '0.5'))
+EASYPOST_BACKOFF_MAX = float(os.environ.get('EASYPOST_BACKOFF_MAX', '8'))
+EASYPOST_POOL_SIZE = int(os.environ.get('EASYPOST_POOL_SIZE', '10'))
+# Shared secret configured on the EasyPost webhook; unsigned webhooks are rejected
+EASYPOST_WEBHOOK_SECRET = os.environ.get('EASYPOST_WEBHOOK_SECRET', '')
+# Requests per second per process; 0 disables the limiter
+EASYPOST_RATE_LIMIT = float(os.environ.get('EASYPOST_RATE_LIMIT', '5'))
+# Seconds an address that failed verification is rejected before EasyPost is asked again
+ADDRESS_VERIFICATION_FAILURE_TTL = int(os.environ.get('ADDRESS_VERIFICATION_FAILURE_TTL', '86400'))
+# Carrier accounts to fetch rates from concurrently, as CARRIER:account_id pairs
+# ("GSO:ca_123,UPS:ca_456"); empty sends one rate request covering every account
+EASYPOST_CARRIER_ACCOUNTS = [
+    tuple(pair.strip().split(':', 1))
+    for pair in os.environ.get('EASYPOST_CARRIER_ACCOUNTS', '').split(',')
+    if ':' in pair
+]
+# Seconds to wait for carrier accounts' rates; the best rate in by then is bought
+RATE_SHOPPING_DEADLINE = float(os.environ.get('RATE_SHOPPING_DEADLINE', '8'))
+# Carriers shops buy from unless their profile lists others
+RATE_DEFAULT_CARRIERS = os.environ.get('RATE_DEFAULT_CARRIERS', 'GSO')
+
+# Metrics. Each web/worker process writes its counters to METRICS_DIR so /metrics
+# and cache_stats can add them up across workers. It must be a local directory
+# (one per host) shared by every process on the host. Setting it to an empty
+# string reports only the process that serves /metrics, which is a random
+# worker under a multi-process server.
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+# Bearer token for scrapers; staff users can always read /metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Outbound EasyPost calls are logged to ApiCallLog in batches of this size
+API_LOG_BATCH_SIZE = int(os.environ.get('API_LOG_BATCH_SIZE', '50'))
+
+# Labels never change once bought, so browsers may keep them this long (seconds)
+LABEL_CACHE_MAX_AGE = int(os.environ.get('LABEL_CACHE_MAX_AGE', '86400'))
+# Most labels one ZIP download may contain
+LABEL_ZIP_MAX = int(os.environ.get('LABEL_ZIP_MAX', '200'))
+
+# Admin changelists count rows exactly up to this many, then estimate
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get('ADMIN_EXACT_COUNT_LIMIT', '10000'))
+
+# Background label purchasing
+LABEL_JOB_MAX_ATTEMPTS = int(os.environ.get('LABEL_JOB_MAX_ATTEMPTS', '5'))
+LABEL_JOB_RETRY_DELAY = float(os.environ.get('LABEL_JOB_RETRY_DELAY', '10'))
+LABEL_JOB_LOCK_TIMEOUT = int(os.environ.get('LABEL_JOB_LOCK_TIMEOUT', '600'))
+
+# Seconds anonymous marketing pages and rendered shipment/booking fragments are kept
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', '600'))
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', '86400'))
+
+# Caches. The default cache holds sessions, users and profiles, so it must be
+# shared by every web worker (a per-process cache would keep serving sessions
+# another worker has logged out); the file cache is shared by all workers on
+# the host. For more than one host, or a busy site, set CACHE_BACKEND to
+# django.core.cache.backends.redis.RedisCache (or memcached) and CACHE_LOCATION
+# to its URL. The fragments cache is per process; its keys carry versions kept in
+# the database or the default cache. The rates cache keeps EasyPost rate quotes
+# in the same shared backend, so a lane one worker has quoted isn't sent to
+# EasyPost again by another. That trades the LRU eviction of a per-process
+# LocMemCache for sharing: the file cache culls a random third of its entries
+# once RATE_CACHE_MAX_ENTRIES is reached, and Redis evicts by its own
+# maxmemory-policy (use allkeys-lru). Setting RATE_CACHE_BACKEND to
+# django.core.cache.backends.locmem.LocMemCache gives back a per-process LRU.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+    },
+    # Rendered pages and template fragments (see boardshipper.caching)
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'boardshipper-fragments',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', '20000')),
+        },
+    },
+    # EasyPost rate quotes (see boardshipper.rate_cache)
+    'rates': {
+        'BACKEND': os.environ.get('RATE_CACHE_BACKEND', os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache')),
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        'KEY_PREFIX': 'rates',
+        'TIMEOUT': int(os.environ.get('RATE_CACHE_TTL', '3600')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('RATE_CACHE_MAX_ENTRIES', '5000')),
+        },
+    },
+}
+if CACHES['default']['BACKEND'].endswith('.FileBasedCache'):
+    # Sessions, users, profiles and per-user change stamps all live here. Django's
+    # default of 300 entries would cull a third of them on most writes.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '20000')),
+    }
+if CACHES['rates']['BACKEND'].endswith('.FileBasedCache'):
+    # Culling counts every file in the directory, so rates get their own
+    CACHES['rates']['LOCATION'] = os.path.join(CACHES['rates']['LOCATION'], 'rates')
+if TESTING:
+    # Keep tests' sessions and change stamps out of the development server's cache
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'boardshipper-tests',
+    }
+    CACHES['rates'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'boardshipper-tests-rates',
+    }
+    # Tests count this process's metrics only
+    METRICS_DIR = ''